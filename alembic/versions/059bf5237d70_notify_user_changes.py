@@ -0,0 +1,52 @@
+"""notify user changes
+
+Every insert, update and delete on users sends NOTIFY user_changed with a
+JSON payload (op, user_id, email) so each worker can evict its cached
+snapshots of that user (src/db/notifications.py).
+
+Revision ID: 059bf5237d70
+Revises: 101e99cd84ba
+Create Date: 2026-10-17 20:55:28.808232
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '059bf5237d70'
+down_revision: Union[str, None] = '101e99cd84ba'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("""
+        CREATE OR REPLACE FUNCTION notify_user_changed() RETURNS trigger AS $$
+        DECLARE
+            changed RECORD;
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                changed := OLD;
+            ELSE
+                changed := NEW;
+            END IF;
+            PERFORM pg_notify('user_changed', json_build_object(
+                'op', TG_OP, 'user_id', changed.user_id, 'email', lower(changed.email)
+            )::text);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER users_notify_changed
+        AFTER INSERT OR UPDATE OR DELETE ON users
+        FOR EACH ROW EXECUTE FUNCTION notify_user_changed()
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS users_notify_changed ON users")
+    op.execute("DROP FUNCTION IF EXISTS notify_user_changed()")
@@ -0,0 +1,43 @@
+"""case insensitive email index
+
+Refuses to run while the table holds emails differing only in case, listing
+them; `python -m src.cli dedupe-emails --apply` retires all but one account
+per email (deactivated, email suffixed with #duplicate-<user_id>).
+
+Revision ID: 101e99cd84ba
+Revises: 78e9f3fe7a9d
+Create Date: 2026-10-17 20:42:49.397008
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '101e99cd84ba'
+down_revision: Union[str, None] = '78e9f3fe7a9d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    duplicates = op.get_bind().execute(sa.text(
+        "SELECT lower(email) FROM users GROUP BY lower(email) HAVING count(*) > 1 ORDER BY lower(email)"
+    )).scalars().all()
+    if duplicates:
+        listed = ", ".join(duplicates[:20]) + (f" and {len(duplicates) - 20} more" if len(duplicates) > 20 else "")
+        raise RuntimeError(
+            f"{len(duplicates)} emails belong to several accounts differing only in case: {listed}. "
+            "Run `python -m src.cli dedupe-emails` to review them and `--apply` to retire the extra accounts, "
+            "then upgrade again."
+        )
+    op.create_index('ix_users_email_lower', 'users', [sa.text('lower(email)')], unique=True)
+    op.drop_constraint('users_email_key', 'users', type_='unique')
+    op.execute("UPDATE users SET email = lower(email) WHERE email <> lower(email)")
+
+
+def downgrade() -> None:
+    op.create_unique_constraint('users_email_key', 'users', ['email'])
+    op.drop_index('ix_users_email_lower', table_name='users')
@@ -0,0 +1,58 @@
+"""archive deactivated users
+
+users.deactivated_at records when a user was deactivated; users already
+inactive get the migration time, so their retention window starts now.
+users_archive receives users deactivated longer than the retention window
+(python -m src.cli archive-users). The (is_active, user_id) index becomes a
+partial index on live users, plus a small one over archival candidates.
+
+Revision ID: 1f527938fb26
+Revises: 5a27daea0b27
+Create Date: 2026-10-17 21:05:35.922576
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1f527938fb26'
+down_revision: Union[str, None] = '5a27daea0b27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('deactivated_at', sa.DateTime(timezone=True), nullable=True))
+    op.execute("UPDATE users SET deactivated_at = now() WHERE NOT is_active")
+    op.drop_index('ix_users_is_active_user_id', table_name='users')
+    op.create_index('ix_users_active_user_id', 'users', ['user_id'], unique=False, postgresql_where=sa.text('is_active'))
+    op.create_index(
+        'ix_users_deactivated_at', 'users', ['deactivated_at'], unique=False, postgresql_where=sa.text('NOT is_active')
+    )
+    op.create_table(
+        'users_archive',
+        sa.Column('user_id', sa.UUID(), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('surname', sa.String(), nullable=False),
+        sa.Column('email', sa.String(), nullable=False),
+        sa.Column('is_active', sa.Boolean(), nullable=True),
+        sa.Column('hashed_password', sa.String(), nullable=False),
+        sa.Column('roles', sa.Integer(), nullable=False),
+        sa.Column('token_version', sa.Integer(), nullable=False),
+        sa.Column('deactivated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('archived_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('user_id'),
+    )
+    op.create_index('ix_users_archive_email_lower', 'users_archive', [sa.text('lower(email)')], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_users_archive_email_lower', table_name='users_archive')
+    op.drop_table('users_archive')
+    op.drop_index('ix_users_deactivated_at', table_name='users', postgresql_where=sa.text('NOT is_active'))
+    op.drop_index('ix_users_active_user_id', table_name='users', postgresql_where=sa.text('is_active'))
+    op.create_index('ix_users_is_active_user_id', 'users', ['is_active', 'user_id'], unique=False)
+    op.drop_column('users', 'deactivated_at')
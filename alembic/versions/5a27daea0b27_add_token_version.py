@@ -0,0 +1,29 @@
+"""add token version
+
+Bumped whenever a change must invalidate outstanding refresh tokens (email,
+roles, deactivation); refresh tokens carry the version they were issued at.
+
+Revision ID: 5a27daea0b27
+Revises: 059bf5237d70
+Create Date: 2026-10-17 20:58:51.732598
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5a27daea0b27'
+down_revision: Union[str, None] = '059bf5237d70'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('token_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'token_version')
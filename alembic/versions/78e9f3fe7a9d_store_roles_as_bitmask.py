@@ -0,0 +1,58 @@
+"""store roles as bitmask
+
+Revision ID: 78e9f3fe7a9d
+Revises: ef3ec0bfac6a
+Create Date: 2026-10-17 20:41:26.455960
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '78e9f3fe7a9d'
+down_revision: Union[str, None] = 'ef3ec0bfac6a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# PortalRole bits at the time of this migration
+ROLE_BITS = {
+    'ROLE_PORTAL_USER': 1,
+    'ROLE_PORTAL_ADMIN': 2,
+    'ROLE_PORTAL_SUPERADMIN': 4,
+}
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('roles_mask', sa.Integer(), nullable=False, server_default='0'))
+    op.execute(
+        "UPDATE users SET roles_mask = "
+        + " | ".join(
+            f"(CASE WHEN '{name}' = ANY(roles) THEN {bit} ELSE 0 END)" for name, bit in ROLE_BITS.items()
+        )
+    )
+    op.drop_index('ix_users_roles', table_name='users', postgresql_using='gin')
+    op.drop_column('users', 'roles')
+    op.alter_column('users', 'roles_mask', new_column_name='roles', server_default=None)
+    op.create_index('ix_users_admins', 'users', ['user_id'], unique=False, postgresql_where=sa.text('(roles & 2) <> 0'))
+    op.create_index('ix_users_superadmins', 'users', ['user_id'], unique=False, postgresql_where=sa.text('(roles & 4) <> 0'))
+
+
+def downgrade() -> None:
+    op.drop_index('ix_users_superadmins', table_name='users', postgresql_where=sa.text('(roles & 4) <> 0'))
+    op.drop_index('ix_users_admins', table_name='users', postgresql_where=sa.text('(roles & 2) <> 0'))
+    op.add_column(
+        'users',
+        sa.Column('roles_array', postgresql.ARRAY(sa.String()), nullable=False, server_default='{}'),
+    )
+    op.execute(
+        "UPDATE users SET roles_array = array_remove(ARRAY["
+        + ", ".join(f"CASE WHEN roles & {bit} <> 0 THEN '{name}' END" for name, bit in ROLE_BITS.items())
+        + "]::varchar[], NULL)"
+    )
+    op.drop_column('users', 'roles')
+    op.alter_column('users', 'roles_array', new_column_name='roles', server_default=None)
+    op.create_index('ix_users_roles', 'users', ['roles'], unique=False, postgresql_using='gin')
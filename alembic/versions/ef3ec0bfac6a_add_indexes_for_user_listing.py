@@ -0,0 +1,28 @@
+"""add indexes for user listing
+
+Revision ID: ef3ec0bfac6a
+Revises: 325562f88228
+Create Date: 2026-10-17 20:38:02.422318
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'ef3ec0bfac6a'
+down_revision: Union[str, None] = '325562f88228'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_users_is_active_user_id', 'users', ['is_active', 'user_id'], unique=False)
+    op.create_index('ix_users_roles', 'users', ['roles'], unique=False, postgresql_using='gin')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_users_roles', table_name='users', postgresql_using='gin')
+    op.drop_index('ix_users_is_active_user_id', table_name='users')
@@ -0,0 +1,111 @@
+"""Per-call CPU cost of the request hot paths that never touch the database.
+
+  * UserCreate / UpdatedUserRequest validation, including the
+    LETTER_MATCH_PATTERN name checks and a rejected name;
+  * ShowUser built from keyword arguments (POST /user/) and from an ORM
+    User through from_attributes (what response_model does for GET /user/),
+    plus its JSON dump;
+  * create_access_token and jwt.decode of the same token.
+
+No database is needed: the engine is created lazily and never connects.
+Results can be saved with --output and compared against an earlier run with
+--compare to catch regressions after pydantic, jose or model changes.
+
+    python -m benchmarks.bench_cpu_hot_paths [--iterations N] [--output PATH] [--compare PATH]
+"""
+import argparse
+import json
+import timeit
+import uuid
+from datetime import timedelta
+
+from fastapi import HTTPException
+from jose import jwt
+
+from src.api.handlers.auth.auth import create_access_token
+from src.api.models import LETTER_MATCH_PATTERN, ShowUser, UpdatedUserRequest, UserCreate
+from src.db.models import PortalRole, User
+from src.settings import ALGORITHM, SECRET_KEY
+
+SIGNUP_PAYLOAD = {
+    "name": "Konstantin",
+    "surname": "Rokossovsky-Petrov",
+    "email": "  Konstantin.Rokossovsky@Example.COM ",
+    "password": "correct horse battery staple",
+}
+UPDATE_PAYLOAD = {"name": "Александр", "email": "alexander@example.com"}
+INVALID_NAME_PAYLOAD = {**SIGNUP_PAYLOAD, "name": "R2-D2"}
+
+
+def _per_call_us(func, iterations: int) -> float:
+    return min(timeit.repeat(func, number=iterations, repeat=5)) / iterations * 1e6
+
+
+def _rejected_signup():
+    try:
+        UserCreate(**INVALID_NAME_PAYLOAD)
+    except HTTPException:
+        pass
+
+
+def _cases() -> dict:
+    user = User(
+        user_id=uuid.uuid4(),
+        name="Konstantin",
+        surname="Rokossovsky",
+        email="konstantin.rokossovsky@example.com",
+        is_active=True,
+        hashed_password="$2b$12$" + "x" * 53,
+        roles=PortalRole.ROLE_PORTAL_USER,
+    )
+    show_user = ShowUser.model_validate(user)
+    token = create_access_token(
+        data={"sub": user.email, "other_custom_data": [1, 2, 3, 4]}, expires_delta=timedelta(minutes=30)
+    )
+    return {
+        "LETTER_MATCH_PATTERN.match": lambda: LETTER_MATCH_PATTERN.match(SIGNUP_PAYLOAD["surname"]),
+        "UserCreate (valid)": lambda: UserCreate(**SIGNUP_PAYLOAD),
+        "UserCreate (rejected name)": _rejected_signup,
+        "UpdatedUserRequest": lambda: UpdatedUserRequest(**UPDATE_PAYLOAD),
+        "ShowUser(**fields)": lambda: ShowUser(
+            user_id=user.user_id, name=user.name, surname=user.surname, email=user.email, is_active=user.is_active,
+        ),
+        "ShowUser.model_validate(orm)": lambda: ShowUser.model_validate(user),
+        "ShowUser.model_dump_json": show_user.model_dump_json,
+        "create_access_token": lambda: create_access_token(
+            data={"sub": user.email, "other_custom_data": [1, 2, 3, 4]}, expires_delta=timedelta(minutes=30)
+        ),
+        "jwt.decode": lambda: jwt.decode(token=token, key=SECRET_KEY, algorithms=ALGORITHM),
+    }
+
+
+def run(iterations: int) -> dict[str, float]:
+    return {name: round(_per_call_us(func, iterations), 3) for name, func in _cases().items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=5000)
+    parser.add_argument("--output", help="save the results as JSON")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    results = run(args.iterations)
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+
+    print(f"{'per call (us)':<32}{'now':>10}" + (f"{'before':>10}{'change':>9}" if baseline else ""))
+    for name, value in results.items():
+        line = f"{name:<32}{value:>10.2f}"
+        if name in baseline:
+            line += f"{baseline[name]:>10.2f}{(value / baseline[name] - 1) * 100:>+8.1f}%"
+        print(line)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
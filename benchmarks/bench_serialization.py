@@ -0,0 +1,113 @@
+"""Response serialization cost: FastAPI's response_model path vs ModelResponse.
+
+For GET /user/ (an ORM User), POST /user/ and GET /user/list (a page of
+ORM users) it times, per response:
+
+  * stdlib:  FastAPI's own pass (validate against response_model -> jsonable
+             dict) rendered by JSONResponse, i.e. json.dumps (the old path);
+  * orjson:  the same pass rendered by ORJSONResponse (routes still
+             returning models under the new default_response_class);
+  * single:  ShowUser.from_user + ModelResponse, one pydantic-core dump.
+
+No database is needed.
+
+    python -m benchmarks.bench_serialization [--iterations N] [--page-size N]
+"""
+import argparse
+import asyncio
+import time
+import uuid
+
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from src.api.models import ShowUser, UserPage
+from src.api.responses import ModelResponse
+from src.db.models import PortalRole, User
+
+
+def _user(index: int) -> User:
+    return User(
+        user_id=uuid.uuid4(),
+        name="Konstantin",
+        surname="Rokossovsky",
+        email=f"user{index}@example.com",
+        is_active=True,
+        hashed_password="-",
+        roles=PortalRole.ROLE_PORTAL_USER,
+    )
+
+
+async def _per_call_us(func, iterations: int) -> float:
+    for _ in range(min(iterations, 100)):
+        await func()
+    timings = []
+    for _ in range(5):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            await func()
+        timings.append(time.perf_counter() - started)
+    return min(timings) / iterations * 1e6
+
+
+async def bench(iterations: int, page_size: int) -> None:
+    user = _user(0)
+    page = [_user(index) for index in range(page_size)]
+    show_user_field = create_response_field(name="Response_get_user", type_=ShowUser, mode="serialization")
+    user_page_field = create_response_field(name="Response_list_users", type_=UserPage, mode="serialization")
+
+    async def fastapi_path(field, content, response_class):
+        return response_class(await serialize_response(field=field, response_content=content)).body
+
+    def signup_model():
+        return ShowUser(
+            user_id=user.user_id, name=user.name, surname=user.surname, email=user.email, is_active=user.is_active,
+        )
+
+    def page_model():
+        return UserPage(users=[ShowUser.model_validate(item) for item in page], next_cursor="cursor")
+
+    cases = {
+        "GET /user/ (orm)": {
+            "stdlib": lambda: fastapi_path(show_user_field, user, JSONResponse),
+            "orjson": lambda: fastapi_path(show_user_field, user, ORJSONResponse),
+            "single": lambda: _sync(lambda: ModelResponse(ShowUser.from_user(user)).body),
+        },
+        "POST /user/": {
+            "stdlib": lambda: fastapi_path(show_user_field, signup_model(), JSONResponse),
+            "orjson": lambda: fastapi_path(show_user_field, signup_model(), ORJSONResponse),
+            "single": lambda: _sync(lambda: ModelResponse(ShowUser.from_user(user)).body),
+        },
+        f"GET /user/list ({page_size})": {
+            "stdlib": lambda: fastapi_path(user_page_field, page_model(), JSONResponse),
+            "orjson": lambda: fastapi_path(user_page_field, page_model(), ORJSONResponse),
+            "single": lambda: _sync(lambda: ModelResponse(UserPage.model_construct(
+                users=[ShowUser.from_user(item) for item in page], next_cursor="cursor"
+            )).body),
+        },
+    }
+    print(f"{'per response (us)':<28}{'stdlib':>10}{'orjson':>10}{'single':>10}{'speedup':>9}")
+    for name, variants in cases.items():
+        per_call = {variant: await _per_call_us(func, max(iterations // (page_size if 'list' in name else 1), 10))
+                    for variant, func in variants.items()}
+        print(
+            f"{name:<28}{per_call['stdlib']:>10.2f}{per_call['orjson']:>10.2f}{per_call['single']:>10.2f}"
+            f"{per_call['stdlib'] / per_call['single']:>8.1f}x"
+        )
+
+
+async def _sync(func):
+    return func()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=5000)
+    parser.add_argument("--page-size", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(bench(args.iterations, args.page_size))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Microbenchmark for the hot UserDAL lookups.
+
+Compares the old per-call `select(User).where(...)` construction with the
+module-level statements in src.db.dals:
+
+  * python: statement construction + cache key (what every execute() pays
+    before it can reuse compiled SQL), and a full compile for reference;
+  * e2e: per-call latency of get_user_by_email through an AsyncSession
+    against DATABASE_URL (skipped with --no-db).
+
+    python -m benchmarks.bench_user_lookups [--iterations N] [--no-db]
+"""
+import argparse
+import asyncio
+import time
+import timeit
+import uuid
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql.asyncpg import dialect as asyncpg_dialect
+
+from src.db.dals import USER_BY_EMAIL_QUERY, UserDAL
+from src.db.models import PortalRole, User
+
+
+def _per_call_us(func, iterations: int) -> float:
+    return min(timeit.repeat(func, number=iterations, repeat=5)) / iterations * 1e6
+
+
+def bench_python(iterations: int) -> None:
+    dialect = asyncpg_dialect()
+    email = "lookup@bench.com"
+
+    def rebuilt_cache_key():
+        select(User).where(func.lower(User.email) == email)._generate_cache_key()
+
+    def cached_cache_key():
+        USER_BY_EMAIL_QUERY._generate_cache_key()
+
+    def full_compile():
+        select(User).where(func.lower(User.email) == email).compile(dialect=dialect)
+
+    print("python-side cost per lookup (us)")
+    print(f"  rebuilt select + cache key   {_per_call_us(rebuilt_cache_key, iterations):8.2f}")
+    print(f"  cached select  + cache key   {_per_call_us(cached_cache_key, iterations):8.2f}")
+    print(f"  uncached full compile        {_per_call_us(full_compile, iterations):8.2f}")
+
+
+async def _rebuilt_lookup(session, email: str):
+    response = await session.execute(select(User).where(func.lower(User.email) == email))
+    return response.fetchone()
+
+
+async def bench_e2e(iterations: int) -> None:
+    from src.db.session import async_session, engine
+
+    engine.echo = False
+    email = f"{uuid.uuid4().hex[:12]}@bench.com"
+    async with async_session() as session:
+        async with session.begin():
+            await UserDAL(session).create_user(
+                name="Bench", surname="Lookup", email=email, hashed_password="-",
+                roles=PortalRole.ROLE_PORTAL_USER,
+            )
+    async with async_session() as session:
+        user_dal = UserDAL(session)
+        for name, lookup in (
+            ("rebuilt select", lambda: _rebuilt_lookup(session, email)),
+            ("cached select", lambda: user_dal.get_user_by_email(email)),
+        ):
+            for _ in range(50):
+                await lookup()
+            started = time.perf_counter()
+            for _ in range(iterations):
+                await lookup()
+                session.expunge_all()
+            elapsed = time.perf_counter() - started
+            print(f"  {name:<28} {elapsed / iterations * 1e6:8.2f}")
+        await session.rollback()
+    await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--no-db", action="store_true", help="only measure the python-side cost")
+    args = parser.parse_args()
+    bench_python(args.iterations)
+    if not args.no_db:
+        print("end-to-end get_user_by_email latency (us)")
+        asyncio.run(bench_e2e(args.iterations))
+
+
+if __name__ == "__main__":
+    main()
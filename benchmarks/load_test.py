@@ -0,0 +1,262 @@
+"""Load test for the user and login endpoints.
+
+Drives the app through httpx, either in-process over ASGI (default) or
+against a running server (--url), with `--concurrency` clients per
+scenario. Scenarios run in order, each one reusing the users created by
+signup:
+
+  signup, login, get, patch, grant_admin, revoke_admin, delete
+
+For every scenario it prints throughput and p50/p95/p99 latency and saves
+the results as JSON (benchmarks/results/<commit>.json by default). Pass
+--compare with an earlier results file to print the change per endpoint.
+
+The admin scenarios promote one user to superadmin straight through
+DATABASE_URL, so the database has to be reachable from here even with --url
+(the test Postgres from docker-compose works: `make up`).
+
+    python -m benchmarks.load_test [--requests N] [--concurrency C] [--url URL]
+                                   [--output PATH] [--compare PATH]
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import subprocess
+import time
+import uuid
+from dataclasses import dataclass, field, asdict
+from typing import Awaitable, Callable, Optional
+
+import httpx
+
+from src.db.dals import UserDAL
+from src.db.models import PortalRole
+
+PASSWORD = "load-test"
+
+
+@dataclass
+class BenchUser:
+    user_id: str
+    email: str
+    headers: dict = field(default_factory=dict)
+
+
+@dataclass
+class ScenarioResult:
+    name: str
+    requests: int
+    errors: int
+    seconds: float
+    throughput: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    max_ms: float
+    statuses: dict
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(fraction * len(sorted_values)) - 1, 0)
+    return sorted_values[rank]
+
+
+async def run_scenario(
+        name: str, total: int, concurrency: int, request: Callable[[int], Awaitable[httpx.Response]]
+) -> ScenarioResult:
+    latencies: list[float] = []
+    statuses: dict[str, int] = {}
+    next_index = iter(range(total))
+
+    async def client_loop():
+        for index in next_index:
+            started = time.perf_counter()
+            try:
+                response = await request(index)
+                status = str(response.status_code)
+            except httpx.HTTPError as err:
+                status = type(err).__name__
+            latencies.append(time.perf_counter() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client_loop() for _ in range(min(concurrency, total))))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    errors = sum(count for status, count in statuses.items() if not status.startswith("2"))
+    return ScenarioResult(
+        name=name,
+        requests=total,
+        errors=errors,
+        seconds=round(elapsed, 3),
+        throughput=round(total / elapsed, 1) if elapsed else 0.0,
+        p50_ms=round(percentile(latencies, 0.50) * 1000, 2),
+        p95_ms=round(percentile(latencies, 0.95) * 1000, 2),
+        p99_ms=round(percentile(latencies, 0.99) * 1000, 2),
+        max_ms=round(latencies[-1] * 1000, 2) if latencies else 0.0,
+        statuses=statuses,
+    )
+
+
+async def _make_superadmin(user_id: str) -> None:
+    from src.db.session import async_session
+
+    async with async_session() as session:
+        async with session.begin():
+            await UserDAL(session).update_user(
+                user_id=uuid.UUID(user_id),
+                roles=PortalRole.ROLE_PORTAL_USER | PortalRole.ROLE_PORTAL_SUPERADMIN,
+            )
+
+
+async def run_load_test(client: httpx.AsyncClient, total: int, concurrency: int) -> list[ScenarioResult]:
+    users: list[Optional[BenchUser]] = [None] * total
+    results = []
+
+    async def signup(index: int) -> httpx.Response:
+        email = f"load-{uuid.uuid4().hex[:12]}@bench.com"
+        response = await client.post(
+            "/user/", json={"name": "Load", "surname": "Test", "email": email, "password": PASSWORD}
+        )
+        if response.status_code == 200:
+            users[index] = BenchUser(user_id=response.json()["user_id"], email=email)
+        return response
+
+    results.append(await run_scenario("POST /user/ (signup)", total, concurrency, signup))
+    created = [user for user in users if user is not None]
+    if len(created) < 2:
+        raise SystemExit(f"signup failed for all but {len(created)} users, see the statuses above")
+
+    async def login(index: int) -> httpx.Response:
+        user = created[index % len(created)]
+        response = await client.post("/login/token", data={"username": user.email, "password": PASSWORD})
+        if response.status_code == 200:
+            user.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        return response
+
+    results.append(await run_scenario("POST /login/token", total, concurrency, login))
+
+    # the last user administers the rest and is never deleted
+    superadmin, targets = created[-1], created[:-1]
+    await _make_superadmin(superadmin.user_id)
+    # a fresh token, the one from the login scenario may be cached with the old roles
+    response = await client.post("/login/token", data={"username": superadmin.email, "password": PASSWORD})
+    superadmin.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    async def get_user(index: int) -> httpx.Response:
+        user = targets[index % len(targets)]
+        return await client.get("/user/", params={"user_id": user.user_id}, headers=user.headers)
+
+    async def patch_user(index: int) -> httpx.Response:
+        user = targets[index % len(targets)]
+        return await client.patch(
+            "/user/", params={"user_id": user.user_id}, json={"name": "Renamed" if index % 2 else "Load"}, headers=user.headers
+        )
+
+    async def grant_admin(index: int) -> httpx.Response:
+        return await client.patch(
+            "/user/admin_privilege", params={"user_id": targets[index].user_id}, headers=superadmin.headers
+        )
+
+    async def revoke_admin(index: int) -> httpx.Response:
+        return await client.delete(
+            "/user/admin_privilege", params={"user_id": targets[index].user_id}, headers=superadmin.headers
+        )
+
+    async def delete_user(index: int) -> httpx.Response:
+        user = targets[index]
+        return await client.delete("/user/", params={"user_id": user.user_id}, headers=user.headers)
+
+    results.append(await run_scenario("GET /user/", total, concurrency, get_user))
+    results.append(await run_scenario("PATCH /user/", total, concurrency, patch_user))
+    results.append(await run_scenario("PATCH /user/admin_privilege", len(targets), concurrency, grant_admin))
+    results.append(await run_scenario("DELETE /user/admin_privilege", len(targets), concurrency, revoke_admin))
+    results.append(await run_scenario("DELETE /user/", len(targets), concurrency, delete_user))
+    return results
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_results(results: list[ScenarioResult], baseline: Optional[dict] = None) -> None:
+    previous = {item["name"]: item for item in (baseline or {}).get("scenarios", [])}
+    header = f"{'scenario':<32}{'reqs':>6}{'err':>5}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+    print(header + ("  p95 vs baseline" if previous else ""))
+    for result in results:
+        line = (
+            f"{result.name:<32}{result.requests:>6}{result.errors:>5}{result.throughput:>9.1f}"
+            f"{result.p50_ms:>9.2f}{result.p95_ms:>9.2f}{result.p99_ms:>9.2f}"
+        )
+        before = previous.get(result.name)
+        if before and before["p95_ms"]:
+            line += f"  {(result.p95_ms / before['p95_ms'] - 1) * 100:+.1f}%"
+        print(line)
+
+
+async def main(args) -> dict:
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=args.timeout)
+    else:
+        from src.main import app
+
+        client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=args.timeout
+        )
+    async with client:
+        results = await run_load_test(client, args.requests, args.concurrency)
+    if not args.url:
+        from src.api.handlers.auth.hasher import hashing_service
+        from src.db.session import engine
+
+        hashing_service.shutdown()
+        await engine.dispose()
+    return {
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "target": args.url or "asgi",
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "scenarios": [asdict(result) for result in results],
+    }
+
+
+def cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--url", help="base URL of a running server, in-process ASGI if omitted")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--output", help="results file, benchmarks/results/<commit>.json by default")
+    parser.add_argument("--compare", help="earlier results file to compare p95 against")
+    args = parser.parse_args()
+
+    report = asyncio.run(main(args))
+    baseline = None
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+    print_results([ScenarioResult(**item) for item in report["scenarios"]], baseline)
+
+    output = args.output or os.path.join(os.path.dirname(__file__), "results", f"{report['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"results saved to {output}")
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,109 @@
+"""Count database round trips per endpoint.
+
+Runs every user/login endpoint once in-process (httpx over ASGI) against the
+database from DATABASE_URL and prints, per request, how many transactions
+were opened and how many round trips (BEGIN, statements, COMMIT/ROLLBACK)
+reached the server. The auth cache is cleared before each request so the
+numbers show the cold path.
+
+    python -m benchmarks.round_trips
+"""
+import asyncio
+import uuid
+from collections import Counter
+
+import httpx
+from sqlalchemy import event
+
+from src.api.handlers.auth.cache import user_cache
+from src.db.dals import UserDAL
+from src.db.models import PortalRole
+from src.db.session import async_session, engine
+from src.main import app
+
+counter = Counter()
+
+
+@event.listens_for(engine.sync_engine, "begin")
+def _on_begin(conn):
+    counter["begin"] += 1
+
+
+@event.listens_for(engine.sync_engine, "commit")
+def _on_commit(conn):
+    counter["commit"] += 1
+
+
+@event.listens_for(engine.sync_engine, "rollback")
+def _on_rollback(conn):
+    counter["rollback"] += 1
+
+
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def _on_statement(conn, cursor, statement, parameters, context, executemany):
+    counter["statements"] += 1
+
+
+async def _measure(results: list, name: str, request):
+    user_cache.clear()
+    counter.clear()
+    response = await request
+    round_trips = counter["begin"] + counter["statements"] + counter["commit"] + counter["rollback"]
+    results.append((name, response.status_code, counter["begin"], counter["statements"], round_trips))
+    return response
+
+
+async def _create_user(client: httpx.AsyncClient, results: list, name: str) -> tuple:
+    email = f"{uuid.uuid4().hex[:12]}@bench.com"
+    response = await _measure(results, f"POST /user/ ({name})", client.post(
+        "/user/", json={"name": "Bench", "surname": "User", "email": email, "password": "bench"}
+    ))
+    login = await _measure(results, f"POST /login/token ({name})", client.post(
+        "/login/token", data={"username": email, "password": "bench"}
+    ))
+    headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+    return response.json()["user_id"], headers
+
+
+async def _make_superadmin(user_id: str) -> None:
+    async with async_session() as session:
+        async with session.begin():
+            await UserDAL(session).update_user(
+                user_id=uuid.UUID(user_id),
+                roles=PortalRole.ROLE_PORTAL_USER | PortalRole.ROLE_PORTAL_SUPERADMIN,
+            )
+
+
+async def main():
+    engine.echo = False
+    results = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        user_id, headers = await _create_user(client, results, "user")
+        superadmin_id, superadmin_headers = await _create_user(client, results, "superadmin")
+        await _make_superadmin(superadmin_id)
+
+        await _measure(results, "GET /user/", client.get(
+            "/user/", params={"user_id": user_id}, headers=headers
+        ))
+        await _measure(results, "PATCH /user/", client.patch(
+            "/user/", params={"user_id": user_id}, json={"name": "Renamed"}, headers=headers
+        ))
+        await _measure(results, "PATCH /user/admin_privilege", client.patch(
+            "/user/admin_privilege", params={"user_id": user_id}, headers=superadmin_headers
+        ))
+        await _measure(results, "DELETE /user/admin_privilege", client.delete(
+            "/user/admin_privilege", params={"user_id": user_id}, headers=superadmin_headers
+        ))
+        await _measure(results, "DELETE /user/", client.delete(
+            "/user/", params={"user_id": user_id}, headers=headers
+        ))
+    await engine.dispose()
+
+    print(f"{'endpoint':<36}{'status':>8}{'txns':>6}{'stmts':>7}{'round trips':>13}")
+    for name, status_code, transactions, statements, round_trips in results:
+        print(f"{name:<36}{status_code:>8}{transactions:>6}{statements:>7}{round_trips:>13}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,59 +1,172 @@
+import asyncio
+import secrets
+from logging import getLogger
 from typing import Union, Optional
+from uuid import UUID
 from jose import jwt, JWTError
 from fastapi.security import OAuth2PasswordBearer
 from fastapi import status
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import APIRouter, Depends, HTTPException 
 from src.db.dals import UserDAL
-from src.db.session import get_db 
+from src.db.session import get_read_db, async_session, unit_of_work
 from src.api.handlers.auth.hasher import Hasher
+from src.api.handlers.auth.cache import UserSnapshot, user_cache
+from src.api.handlers.auth.email_filter import email_filter
+from src.metrics import timed
+from src.api.models import Token
+from src.db.models import PortalRole, User
 from src.settings import ACCESS_TOKEN_EXPIRE_MINUTES, SECRET_KEY, ALGORITHM
+from src.config import AUTH_CLAIMS_TOKENS, CLAIMS_ACCESS_TOKEN_EXPIRE_MINUTES, REFRESH_TOKEN_EXPIRE_DAYS
+
+logger = getLogger(__name__)
 
 login_router = APIRouter()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/login/token")
 
+# strong references to fire-and-forget rehash tasks until they finish
+_rehash_tasks: set[asyncio.Task] = set()
+
+_dummy_hash: Optional[str] = None
+
+async def _verify_dummy_password(password: str) -> None:
+    """Spends the same bcrypt time as a real check so unknown emails are not told apart by latency"""
+    global _dummy_hash
+    if _dummy_hash is None:
+        _dummy_hash = await Hasher.get_password_hash_async(secrets.token_hex(16))
+    await Hasher.verify_password_async(password, _dummy_hash)
+
 async def _get_user_by_email_for_auth(email: str, session: AsyncSession):
-    async with session.begin():
-        user_dal = UserDAL(session)
-        return await user_dal.get_user_by_email(
-            email=email,
-        )
+    user_dal = UserDAL(session)
+    return await user_dal.get_user_by_email(
+        email=email,
+    )
 
 async def authenticate_user(email: str, password: str, db: AsyncSession):
+    if not email_filter.might_exist(email): 
+        await _verify_dummy_password(password)
+        return 
     user = await _get_user_by_email_for_auth(email, db)
     if user is None: 
+        await _verify_dummy_password(password)
         return 
-    if not Hasher.verify_password(password, user.hashed_password): 
+    if not await Hasher.verify_password_async(password, user.hashed_password): 
         return 
+    if Hasher.needs_update(user.hashed_password): 
+        task = asyncio.create_task(_rehash_password(user.user_id, user.hashed_password, password))
+        _rehash_tasks.add(task)
+        task.add_done_callback(_rehash_tasks.discard)
     return user
 
-async def get_current_user_from_token(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)): 
+async def _rehash_password(user_id: UUID, old_hash: str, password: str) -> None:
+    """Upgrades a hash made with an outdated bcrypt cost, off the login response path"""
+    try:
+        new_hash = await Hasher.get_password_hash_async(password)
+        async with unit_of_work(async_session()) as session:
+            await UserDAL(session).replace_password_hash(user_id, old_hash, new_hash)
+    except Exception as err:
+        logger.warning("Password rehash for user %s failed: %s", user_id, err)
+
+async def get_current_user_from_token(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_read_db)) -> Union[UserSnapshot, None]: 
+    cached_user = user_cache.get(token)
+    if cached_user is not None: 
+        return cached_user
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials"
     )
     try: 
-        payload = jwt.decode(
-            token=token, key=SECRET_KEY, algorithms=ALGORITHM
-        )
+        with timed("jwt"):
+            payload = jwt.decode(
+                token=token, key=SECRET_KEY, algorithms=ALGORITHM
+            )
         email: str = payload.get("sub")
         print("username/email extracted is ", email)
         if email is None: 
             raise credentials_exception
     except JWTError: 
         raise credentials_exception
+    token_type = payload.get("typ")
+    if token_type == REFRESH_TOKEN_TYPE:
+        raise credentials_exception
+    if token_type == ACCESS_TOKEN_TYPE and AUTH_CLAIMS_TOKENS:
+        # everything authorization needs is in the signed claims, no lookup
+        try:
+            return _snapshot_from_claims(payload)
+        except (KeyError, ValueError, TypeError):
+            raise credentials_exception
+    # taken before the read: an invalidation after this point means the row may be stale
+    generation = user_cache.generation
     user = await _get_user_by_email_for_auth(email=email, session=db)
     if user is None:
         return None
-    return user
+    current_user = UserSnapshot.from_user(user)
+    user_cache.set(token, current_user, token_exp=payload.get("exp"), generation=generation)
+    return current_user
 
 
+ACCESS_TOKEN_TYPE = "access"
+REFRESH_TOKEN_TYPE = "refresh"
+
+def _snapshot_from_claims(payload: dict) -> UserSnapshot:
+    return UserSnapshot(
+        user_id=UUID(payload["uid"]),
+        name=payload["name"],
+        surname=payload["surname"],
+        email=payload["sub"],
+        is_active=True,
+        roles=PortalRole(payload["roles"]),
+    )
+
+def create_token_pair(user: User) -> Token:
+    """Short-lived access token with the claims authorization needs, plus a refresh token for /login/refresh.
+
+    Only the refresh token carries the token version, checked on refresh;
+    access tokens are never checked against the database and stop working
+    when they expire.
+    """
+    access_token = create_access_token(
+        data={
+            "sub": user.email,
+            "typ": ACCESS_TOKEN_TYPE,
+            "uid": str(user.user_id),
+            "name": user.name,
+            "surname": user.surname,
+            "roles": int(user.roles),
+        },
+        expires_delta=timedelta(minutes=CLAIMS_ACCESS_TOKEN_EXPIRE_MINUTES),
+    )
+    refresh_token = create_access_token(
+        data={"sub": user.email, "typ": REFRESH_TOKEN_TYPE, "uid": str(user.user_id), "ver": user.token_version},
+        expires_delta=timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
+    )
+    return Token(access_token=access_token, token_type="bearer", refresh_token=refresh_token)
+
+async def refresh_token_pair(refresh_token: str, session: AsyncSession) -> Token:
+    """New token pair for a refresh token whose user is active and whose version is still current"""
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials"
+    )
+    try:
+        with timed("jwt"):
+            payload = jwt.decode(token=refresh_token, key=SECRET_KEY, algorithms=ALGORITHM)
+        if payload.get("typ") != REFRESH_TOKEN_TYPE:
+            raise credentials_exception
+        user_id = UUID(payload["uid"])
+    except (JWTError, KeyError, ValueError, TypeError):
+        raise credentials_exception
+    user = await UserDAL(session).get_user_by_id(user_id=user_id)
+    if user is None or not user.is_active or user.token_version != payload.get("ver"):
+        raise credentials_exception
+    return create_token_pair(user)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None): 
     to_encode = data.copy()
     if expires_delta: 
-        expire = datetime.now() + expires_delta
-    else: expire = datetime.now() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+        expire = datetime.now(timezone.utc) + expires_delta
+    else: expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
     encode_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encode_jwt
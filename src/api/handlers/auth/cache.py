@@ -0,0 +1,142 @@
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional, Union
+from uuid import UUID
+from src.db.dals import forget_inflight_lookups
+from src.db.models import PortalRole, User
+from src.config import AUTH_CACHE_MAXSIZE, AUTH_CACHE_TTL
+
+
+class UserSnapshot(NamedTuple):
+    """Detached read-only copy of the fields authorization needs from `User`"""
+    user_id: UUID
+    name: str
+    surname: str
+    email: str
+    is_active: bool
+    roles: PortalRole
+
+    @property
+    def is_admin(self) -> bool:
+        return bool(self.roles & PortalRole.ROLE_PORTAL_ADMIN)
+
+    @property
+    def is_superadmin(self) -> bool:
+        return bool(self.roles & PortalRole.ROLE_PORTAL_SUPERADMIN)
+
+    @classmethod
+    def from_user(cls, user: User) -> "UserSnapshot":
+        return cls(
+            user_id=user.user_id,
+            name=user.name,
+            surname=user.surname,
+            email=user.email,
+            is_active=user.is_active,
+            roles=user.roles,
+        )
+
+
+class AuthenticatedUserCache:
+    """LRU + TTL cache of token -> UserSnapshot.
+
+    Entries never outlive the token itself, and all tokens of a user can be
+    dropped at once with `invalidate_user`. While `paused` (e.g. the
+    cross-worker invalidation feed is down) nothing is served or stored.
+
+    A lookup takes `generation` before reading the user and passes it to
+    `set`: if the user was invalidated in between, the snapshot it read may
+    predate the change and is not stored.
+    """
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, UserSnapshot]] = OrderedDict()
+        self._tokens_by_user: dict[UUID, set[str]] = {}
+        self.paused = False
+        self._clock = 0
+        # user_id -> clock value of its last invalidation
+        self._invalidated_at: dict[UUID, int] = {}
+        # lookups that started before this are never stored (clear, forgotten invalidations)
+        self._floor = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0 and self.ttl > 0 and not self.paused
+
+    @property
+    def generation(self) -> int:
+        return self._clock
+
+    def set_paused(self, paused: bool) -> None:
+        self.paused = paused
+        self.clear()
+
+    def get(self, token: str) -> Union[UserSnapshot, None]:
+        if self.paused:
+            return None
+        entry = self._entries.get(token)
+        if entry is None:
+            return None
+        expires_at, snapshot = entry
+        if expires_at <= time.monotonic():
+            self._pop(token)
+            return None
+        self._entries.move_to_end(token)
+        return snapshot
+
+    def set(
+            self, token: str, snapshot: UserSnapshot, token_exp: Optional[float] = None, generation: Optional[int] = None
+    ) -> None:
+        if not self.enabled:
+            return
+        if generation is not None and (
+                generation < self._floor or self._invalidated_at.get(snapshot.user_id, -1) > generation
+        ):
+            return
+        ttl = self.ttl
+        if token_exp is not None:
+            ttl = min(ttl, token_exp - time.time())
+        if ttl <= 0:
+            return
+        self._pop(token)
+        self._entries[token] = (time.monotonic() + ttl, snapshot)
+        self._tokens_by_user.setdefault(snapshot.user_id, set()).add(token)
+        while len(self._entries) > self.maxsize:
+            self._pop(next(iter(self._entries)))
+
+    def invalidate_user(self, user_id: UUID) -> None:
+        self._clock += 1
+        if len(self._invalidated_at) >= max(self.maxsize, 1):
+            # forget old invalidations, lookups in flight at this point are not stored
+            self._invalidated_at.clear()
+            self._floor = self._clock
+        self._invalidated_at[user_id] = self._clock
+        # lookups starting from now must not join a query that may have read the old row
+        forget_inflight_lookups()
+        for token in self._tokens_by_user.pop(user_id, ()):
+            self._entries.pop(token, None)
+
+    def clear(self) -> None:
+        self._clock += 1
+        self._floor = self._clock
+        self._invalidated_at.clear()
+        forget_inflight_lookups()
+        self._entries.clear()
+        self._tokens_by_user.clear()
+
+    def _pop(self, token: str) -> None:
+        entry = self._entries.pop(token, None)
+        if entry is None:
+            return
+        user_id = entry[1].user_id
+        tokens = self._tokens_by_user.get(user_id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens_by_user[user_id]
+
+
+user_cache = AuthenticatedUserCache(maxsize=AUTH_CACHE_MAXSIZE, ttl=AUTH_CACHE_TTL)
@@ -0,0 +1,153 @@
+import asyncio
+import hashlib
+import math
+from logging import getLogger
+from typing import Optional
+from src.db.dals import UserDAL
+from src.db.models import normalize_email
+from src.db.session import async_session
+from src.config import (
+    EMAIL_FILTER_ENABLED, EMAIL_FILTER_ERROR_RATE, EMAIL_FILTER_MIN_CAPACITY, EMAIL_FILTER_REFRESH_SECONDS,
+)
+
+logger = getLogger(__name__)
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings, k positions from double hashing one blake2b digest"""
+    def __init__(self, capacity: int, error_rate: float):
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hash_count):
+            yield (first + i * second) % self.size
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def add_many(self, items) -> None:
+        for item in items:
+            self.add(item)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class EmailFilter:
+    """Per-worker answer to "is this email definitely not registered?".
+
+    Until the first build finishes every email "might exist", so callers fall
+    back to the database. Emails registered by other workers arrive through the
+    user_changed listener: while it is down (paused) every email might exist
+    too, and the pause only lifts once a rebuild that started after the
+    listener came back has finished, since the adds sent meanwhile are lost.
+    """
+    def __init__(self, enabled: bool, error_rate: float, min_capacity: int):
+        self.enabled = enabled
+        self.error_rate = error_rate
+        self.min_capacity = min_capacity
+        self._filter: Optional[BloomFilter] = None
+        self._added_during_rebuild: Optional[list[str]] = None
+        self.paused = False
+        self._listening = True
+        # bumped on every connection change: a rebuild only lifts the pause if none happened while it ran
+        self._connection_epoch = 0
+        self._rebuild_tasks: set[asyncio.Task] = set()
+        # one rebuild at a time, they share _added_during_rebuild
+        self._rebuild_lock = asyncio.Lock()
+        self._follow_up_queued = False
+
+    @property
+    def ready(self) -> bool:
+        return self._filter is not None
+
+    @property
+    def active(self) -> bool:
+        """Whether might_exist() can currently answer False at all"""
+        return self.enabled and not self.paused and self._filter is not None
+
+    def might_exist(self, email: str) -> bool:
+        if not self.enabled or self.paused or self._filter is None:
+            return True
+        return normalize_email(email) in self._filter
+
+    def add(self, email: str) -> None:
+        email = normalize_email(email)
+        if self._filter is not None:
+            self._filter.add(email)
+        if self._added_during_rebuild is not None:
+            self._added_during_rebuild.append(email)
+
+    def set_paused(self, paused: bool) -> None:
+        """Paused while other workers' changes cannot reach us; resuming rebuilds before trusting the filter"""
+        self._connection_epoch += 1
+        self._listening = not paused
+        if paused:
+            self.paused = True
+            return
+        if not self.enabled or self._follow_up_queued:
+            return
+        if self._filter is not None or self._rebuild_lock.locked():
+            # with no filter yet the first build (still to come) lifts the pause; a rebuild already
+            # running started before the reconnect, so another one follows it
+            self._follow_up_queued = True
+            task = asyncio.create_task(self._follow_up_rebuild())
+            self._rebuild_tasks.add(task)
+            task.add_done_callback(self._rebuild_tasks.discard)
+
+    async def rebuild(self) -> None:
+        async with self._rebuild_lock:
+            await self._build()
+
+    async def _follow_up_rebuild(self) -> None:
+        async with self._rebuild_lock:
+            # reconnects from now on need a rebuild that starts after this one
+            self._follow_up_queued = False
+            try:
+                await self._build()
+            except Exception as err:
+                logger.warning("Email filter rebuild failed: %s", err)
+
+    async def _build(self) -> None:
+        epoch = self._connection_epoch
+        self._added_during_rebuild = []
+        try:
+            # from the primary: a lagging replica could miss emails the old filter already had
+            async with async_session() as session:
+                user_dal = UserDAL(session)
+                user_count = await user_dal.count_users()
+                bloom = BloomFilter(max(self.min_capacity, user_count * 2), self.error_rate)
+                async for emails in user_dal.stream_emails():
+                    # hashing a whole batch would stall the event loop, the new filter is not shared yet
+                    await asyncio.to_thread(bloom.add_many, emails)
+            for email in self._added_during_rebuild:
+                bloom.add(email)
+            self._filter = bloom
+            if self._listening and self._connection_epoch == epoch:
+                self.paused = False
+        finally:
+            self._added_during_rebuild = None
+
+    async def _rebuild_logged(self) -> None:
+        try:
+            await self.rebuild()
+        except Exception as err:
+            logger.warning("Email filter rebuild failed: %s", err)
+
+    async def refresh_periodically(self, interval: float = EMAIL_FILTER_REFRESH_SECONDS) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            await self._rebuild_logged()
+
+
+email_filter = EmailFilter(
+    enabled=EMAIL_FILTER_ENABLED,
+    error_rate=EMAIL_FILTER_ERROR_RATE,
+    min_capacity=EMAIL_FILTER_MIN_CAPACITY,
+)
@@ -1,12 +1,152 @@
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Optional
+from fastapi import HTTPException, status
 from passlib.context import CryptContext
+from src.config import HASHER_POOL_KIND, HASHER_MAX_WORKERS, HASHER_MAX_PENDING, HASHER_TIMEOUT
+from src.config import BCRYPT_ROUNDS, BCRYPT_MIN_ROUNDS, BCRYPT_MAX_ROUNDS
+from src.metrics import timed
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
-class Hasher: 
+def configure_bcrypt_rounds(rounds: int) -> None:
+    """New hashes use `rounds`, and only hashes made with a lower cost report needs_update.
+
+    Stronger hashes are left alone, so a deployment with a lower cost than
+    another never rehashes accounts down.
+    """
+    pwd_context.update(bcrypt__default_rounds=rounds, bcrypt__min_rounds=rounds)
+
+def measure_bcrypt_ms(rounds: int, samples: int = 3) -> float:
+    context = CryptContext(schemes=["bcrypt"], bcrypt__rounds=rounds)
+    timings = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        context.hash("calibration")
+        timings.append(time.perf_counter() - started)
+    return min(timings) * 1000
+
+def calibrate_bcrypt_rounds(
+        target_ms: float, min_rounds: int = BCRYPT_MIN_ROUNDS, max_rounds: int = BCRYPT_MAX_ROUNDS
+) -> int:
+    """Highest cost whose hash time on this machine stays within `target_ms`, never below `min_rounds`"""
+    rounds = min_rounds
+    # every extra round doubles the cost, so this stops after measuring at most ~2x the target
+    while rounds < max_rounds and measure_bcrypt_ms(rounds + 1) <= target_ms:
+        rounds += 1
+    return rounds
+
+if BCRYPT_ROUNDS is not None:
+    configure_bcrypt_rounds(BCRYPT_ROUNDS)
+
+class Hasher:
     @staticmethod
     def verify_password(plain_password, hashed_password):
         return pwd_context.verify(plain_password, hashed_password)
-    
+
+    @staticmethod
+    def get_password_hash(password: str) -> str:
+        return pwd_context.hash(password)
+
+    @staticmethod
+    def needs_update(hashed_password: str) -> bool:
+        return pwd_context.needs_update(hashed_password)
+
+    @staticmethod
+    async def verify_password_async(plain_password, hashed_password) -> bool:
+        return await hashing_service.run(Hasher.verify_password, plain_password, hashed_password)
+
+    @staticmethod
+    async def get_password_hash_async(password: str) -> str:
+        return await hashing_service.run(Hasher.get_password_hash, password)
+
     @staticmethod
-    def get_password_hash(password: str) -> str: 
-        return pwd_context.hash(password)
\ No newline at end of file
+    async def get_password_hashes_async(passwords: list[str]) -> list[str]:
+        # keep the pool busy without taking every pending slot from concurrent logins
+        limit = asyncio.Semaphore(hashing_service.max_workers)
+
+        async def _hash(password: str) -> str:
+            async with limit:
+                return await Hasher.get_password_hash_async(password)
+
+        return await asyncio.gather(*(_hash(password) for password in passwords))
+
+
+class HashingService:
+    """Runs bcrypt off the event loop in a bounded worker pool.
+
+    Calls beyond `max_pending` in flight are rejected with 503 instead of queueing
+    without limit, and each call is awaited for at most `timeout` seconds.
+    """
+    def __init__(self, pool_kind: str, max_workers: int, max_pending: int, timeout: float):
+        self.pool_kind = pool_kind
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._executor: Optional[Executor] = None
+        self._pending = 0
+        self.bcrypt_rounds: Optional[int] = BCRYPT_ROUNDS
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.pool_kind == "process":
+                # spawn: a forked copy of a running event loop process is not safe to reuse
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=configure_bcrypt_rounds if self.bcrypt_rounds is not None else None,
+                    initargs=(self.bcrypt_rounds, ) if self.bcrypt_rounds is not None else (),
+                )
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="hasher"
+                )
+        return self._executor
+
+    def set_bcrypt_rounds(self, rounds: int) -> None:
+        configure_bcrypt_rounds(rounds)
+        self.bcrypt_rounds = rounds
+        if isinstance(self._executor, ProcessPoolExecutor):
+            # worker processes hold their own context, the next call starts fresh ones
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def _release(self, _future) -> None:
+        self._pending -= 1
+
+    async def run(self, func: Callable, *args):
+        if self._pending >= self.max_pending:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Password hashing queue is full"
+            )
+        loop = asyncio.get_running_loop()
+        job = self._get_executor().submit(func, *args)
+        self._pending += 1
+        # the slot is freed when the worker is actually done, not when we stop waiting
+        job.add_done_callback(lambda future: loop.call_soon_threadsafe(self._release, future))
+        try:
+            with timed("bcrypt"):
+                return await asyncio.wait_for(asyncio.wrap_future(job), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Password hashing timed out"
+            )
+
+    def shutdown(self, wait: bool = True) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
+
+
+hashing_service = HashingService(
+    pool_kind=HASHER_POOL_KIND,
+    max_workers=HASHER_MAX_WORKERS,
+    max_pending=HASHER_MAX_PENDING,
+    timeout=HASHER_TIMEOUT,
+)
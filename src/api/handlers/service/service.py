@@ -0,0 +1,13 @@
+from fastapi import APIRouter
+from src.db.session import pool_status
+from src.api.models import PoolStatus
+from src.metrics import render_metrics
+
+service_router = APIRouter()
+metrics_router = APIRouter()
+
+def _get_pool_status() -> PoolStatus:
+    return PoolStatus(**pool_status())
+
+def _get_metrics() -> str:
+    return render_metrics()
@@ -1,71 +1,274 @@
 
-from uuid import UUID
-from fastapi import APIRouter
+import base64
+import csv
+import io
+import json
+from collections import Counter
+from enum import Enum
+from uuid import UUID, uuid4
+from fastapi import APIRouter, Request
 from fastapi.exceptions import HTTPException
-from typing import Union
-from src.api.models import UserCreate, ShowUser
-from src.db.dals import UserDAL
+from pydantic import ValidationError
+from sqlalchemy.exc import IntegrityError
+from typing import Any, AsyncIterator, Optional, Union
+from src.api.models import UserCreate, ShowUser, UserPage, UserBatch, BulkUserResult, BulkUserStatus, BulkUserCreateResponse
+from src.config import BULK_CHUNK_SIZE, USER_EXPORT_BATCH_SIZE, USER_BATCH_MAX_SIZE
+from src.db.dals import UserDAL, MutationResult, MutationStatus
+from src.db.session import async_read_session, on_commit
 from src.api.handlers.auth.hasher import Hasher
+from src.api.handlers.auth.cache import UserSnapshot, user_cache
+from src.api.handlers.auth.email_filter import email_filter
 from src.db.models import PortalRole
 from src.db.models import User
 
 user_router = APIRouter()
 
 async def _create_new_user(body: UserCreate, session) -> ShowUser:
-    async with session.begin(): 
-        user_dal = UserDAL(session)
+    user_dal = UserDAL(session)
+    # the unique index decides (IntegrityError below); with a built filter a likely taken email
+    # is looked up first so its signup does not pay for bcrypt
+    if email_filter.active and email_filter.might_exist(body.email):
+        existing_user = await user_dal.get_user_by_email(body.email)
+        # ends the read transaction, bcrypt runs with the connection back in the pool
+        await session.commit()
+        if existing_user is not None:
+            raise HTTPException(status_code=409, detail="User with this email already exists")
+    hashed_password = await Hasher.get_password_hash_async(body.password)
+    try:
         user = await user_dal.create_user(
             name = body.name,
             surname = body.surname,
             email = body.email,
-            hashed_password = Hasher.get_password_hash(body.password),
-            roles = [PortalRole.ROLE_PORTAL_USER, ]
-        )
-        return ShowUser(
-            user_id = user.user_id,
-            name = user.name, 
-            surname = user.surname, 
-            email = user.email, 
-            is_active = user.is_active,
+            hashed_password = hashed_password,
+            roles = PortalRole.ROLE_PORTAL_USER,
         )
+    except IntegrityError:
+        raise HTTPException(status_code=409, detail="User with this email already exists")
+    on_commit(session, lambda: email_filter.add(user.email))
+    return ShowUser.from_user(user)
     
-async def _delete_user(user_id, session) -> Union[UUID, None]:
-    async with session.begin(): 
+async def _iter_bulk_records(request: Request) -> AsyncIterator[tuple[Any, Optional[str]]]:
+    """Yields (record, parse error) from a JSON array body or an NDJSON stream"""
+    if request.headers.get("content-type", "").startswith("application/x-ndjson"):
+        buffer = b""
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    yield _parse_ndjson_line(line)
+        if buffer.strip():
+            yield _parse_ndjson_line(buffer)
+        return
+    try:
+        records = json.loads(await request.body())
+    except ValueError:
+        raise HTTPException(status_code=422, detail="Body should be a JSON array or NDJSON")
+    if not isinstance(records, list):
+        raise HTTPException(status_code=422, detail="Body should be a JSON array or NDJSON")
+    for record in records:
+        yield record, None
+
+def _parse_ndjson_line(line: bytes) -> tuple[Any, Optional[str]]:
+    try:
+        return json.loads(line), None
+    except ValueError:
+        return None, "Invalid JSON"
+
+def _validate_bulk_record(record: Any) -> tuple[Optional[UserCreate], Optional[str]]:
+    try:
+        return UserCreate.model_validate(record), None
+    except HTTPException as err:
+        return None, err.detail
+    except ValidationError as err:
+        error = err.errors()[0]
+        return None, f"{'.'.join(str(loc) for loc in error['loc'])}: {error['msg']}"
+
+async def _insert_bulk_chunk(chunk: list[tuple[int, UserCreate]], session, results: list[BulkUserResult]) -> None:
+    user_dal = UserDAL(session)
+    existing_emails = await user_dal.get_existing_emails([body.email for _, body in chunk])
+    new_users = []
+    for index, body in chunk:
+        if body.email in existing_emails:
+            results.append(BulkUserResult(index=index, email=body.email, status=BulkUserStatus.DUPLICATE))
+        else:
+            new_users.append((index, body))
+    # ends the read transaction, the connection goes back to the pool while bcrypt runs;
+    # the INSERT below opens a new one that lasts only for that statement and the commit
+    await session.commit()
+    hashed_passwords = await Hasher.get_password_hashes_async([body.password for _, body in new_users])
+    rows = [
+        {
+            "user_id": uuid4(),
+            "name": body.name,
+            "surname": body.surname,
+            "email": body.email,
+            "is_active": True,
+            "hashed_password": hashed_password,
+            "roles": PortalRole.ROLE_PORTAL_USER,
+        }
+        for (_, body), hashed_password in zip(new_users, hashed_passwords)
+    ]
+    created = await user_dal.create_users(rows)
+
+    def add_created_emails() -> None:
+        for email in created:
+            email_filter.add(email)
+
+    on_commit(session, add_created_emails)
+    for (index, body), row in zip(new_users, rows):
+        # a concurrent signup may have taken the email after the pre-check
+        if created.get(body.email) == row["user_id"]:
+            results.append(BulkUserResult(
+                index=index, email=body.email, status=BulkUserStatus.CREATED, user_id=row["user_id"]
+            ))
+        else:
+            results.append(BulkUserResult(index=index, email=body.email, status=BulkUserStatus.DUPLICATE))
+    # each chunk is durable on its own, a failure later on does not lose earlier rows
+    await session.commit()
+
+async def _create_users_bulk(records: AsyncIterator[tuple[Any, Optional[str]]], session) -> BulkUserCreateResponse:
+    results: list[BulkUserResult] = []
+    seen_emails: set[str] = set()
+    chunk: list[tuple[int, UserCreate]] = []
+    index = 0
+    async for record, error in records:
+        body = None
+        if error is None:
+            body, error = _validate_bulk_record(record)
+        if body is None:
+            email = record.get("email") if isinstance(record, dict) else None
+            results.append(BulkUserResult(index=index, email=email, status=BulkUserStatus.INVALID, detail=error))
+        elif body.email in seen_emails:
+            results.append(BulkUserResult(index=index, email=body.email, status=BulkUserStatus.DUPLICATE))
+        else:
+            seen_emails.add(body.email)
+            chunk.append((index, body))
+            if len(chunk) >= BULK_CHUNK_SIZE:
+                await _insert_bulk_chunk(chunk, session, results)
+                chunk = []
+        index += 1
+    if chunk:
+        await _insert_bulk_chunk(chunk, session, results)
+    results.sort(key=lambda result: result.index)
+    counts = Counter(result.status for result in results)
+    return BulkUserCreateResponse(
+        created=counts[BulkUserStatus.CREATED],
+        duplicates=counts[BulkUserStatus.DUPLICATE],
+        invalid=counts[BulkUserStatus.INVALID],
+        results=results,
+    )
+
+def _encode_cursor(user_id: UUID) -> str:
+    return base64.urlsafe_b64encode(user_id.bytes).decode().rstrip("=")
+
+def _decode_cursor(cursor: str) -> UUID:
+    try:
+        return UUID(bytes=base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except ValueError:
+        raise HTTPException(status_code=422, detail="Invalid cursor")
+
+async def _list_users(
+        session, limit: int, cursor: Optional[str] = None, is_active: Optional[bool] = None, role: Optional[PortalRole] = None
+) -> UserPage:
+    user_dal = UserDAL(session)
+    users = await user_dal.list_users(
+        limit=limit + 1,
+        after_user_id=_decode_cursor(cursor) if cursor else None,
+        is_active=is_active,
+        role=role,
+    )
+    next_cursor = None
+    if len(users) > limit:
+        users = users[:limit]
+        next_cursor = _encode_cursor(users[-1].user_id)
+    return UserPage.model_construct(users=[ShowUser.from_user(user) for user in users], next_cursor=next_cursor)
+
+EXPORT_COLUMNS = ("user_id", "name", "surname", "email", "is_active")
+
+class ExportFormat(str, Enum):
+    NDJSON = "ndjson"
+    CSV = "csv"
+
+EXPORT_MEDIA_TYPES = {
+    ExportFormat.NDJSON: "application/x-ndjson",
+    ExportFormat.CSV: "text/csv",
+}
+
+def _format_export_rows(rows: list, export_format: ExportFormat) -> str:
+    if export_format == ExportFormat.CSV:
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        return buffer.getvalue()
+    return "".join(
+        json.dumps({
+            "user_id": str(user_id), "name": name, "surname": surname, "email": email, "is_active": is_active,
+        }) + "\n"
+        for user_id, name, surname, email, is_active in rows
+    )
+
+async def _export_users(export_format: ExportFormat, after_user_id: Optional[UUID] = None) -> AsyncIterator[str]:
+    # the request session is already closed once the response starts streaming, so the export owns its own
+    async with async_read_session() as session:
         user_dal = UserDAL(session)
-        deleted_user_id = await user_dal.delete_user(
-            user_id=user_id,
-        )
-        return deleted_user_id
+        if export_format == ExportFormat.CSV:
+            yield _format_export_rows([EXPORT_COLUMNS], export_format)
+        async for rows in user_dal.stream_users(after_user_id=after_user_id, batch_size=USER_EXPORT_BATCH_SIZE):
+            yield _format_export_rows(rows, export_format)
+
+def _check_actor(current_user: UserSnapshot) -> None:
+    if current_user.roles & PortalRole.ROLE_PORTAL_SUPERADMIN:
+        raise HTTPException(status_code=406, detail="Superadmin cannot be deleted with via API")
+
+async def _delete_user(user_id, current_user: UserSnapshot, session) -> MutationResult:
+    _check_actor(current_user)
+    user_dal = UserDAL(session)
+    result = await user_dal.delete_user_if_permitted(
+        user_id=user_id,
+        actor_id=current_user.user_id,
+        actor_is_admin=current_user.is_admin,
+    )
+    if result.status == MutationStatus.UPDATED:
+        on_commit(session, lambda: user_cache.invalidate_user(user_id))
+    return result
 
 async def _get_user_by_id(user_id, session) -> Union[User, None]: 
-    async with session.begin(): 
-        user_dal = UserDAL(session)
-        user = await user_dal.get_user_by_id(user_id=user_id)
-        if user is not None: 
-            return user
+    user_dal = UserDAL(session)
+    user = await user_dal.get_user_by_id(user_id=user_id)
+    if user is not None: 
+        return user
             
+async def _get_users_by_ids(user_ids: list[UUID], session) -> UserBatch:
+    requested = list(dict.fromkeys(user_ids))
+    if len(requested) > USER_BATCH_MAX_SIZE:
+        raise HTTPException(status_code=422, detail=f"At most {USER_BATCH_MAX_SIZE} ids per request")
+    user_dal = UserDAL(session)
+    found = {user.user_id: user for user in await user_dal.get_users_by_ids(requested)}
+    return UserBatch.model_construct(
+        users=[ShowUser.from_user(found[user_id]) for user_id in requested if user_id in found],
+        missing=[user_id for user_id in requested if user_id not in found],
+    )
+
 async def _update_user(updated_user_params: dict, user_id: UUID, session) -> Union[UUID, None]:
-    async with session.begin(): 
-        user_dal = UserDAL(session)
-        updated_user_id = await user_dal.update_user(
-            user_id=user_id,
-            **updated_user_params)
-        return updated_user_id
+    user_dal = UserDAL(session)
+    updated_user_id = await user_dal.update_user(
+        user_id=user_id,
+        **updated_user_params)
+    on_commit(session, lambda: user_cache.invalidate_user(user_id))
+    return updated_user_id
 
-def check_user_permissions(target_user: User, current_user: User) -> bool: 
-    if PortalRole.ROLE_PORTAL_SUPERADMIN in current_user.roles:
-        raise HTTPException(status_code=406, detail="Superadmin cannot be deleted with via API")
-    if target_user.user_id != current_user.user_id: 
-        if not {
-            PortalRole.ROLE_PORTAL_ADMIN,
-            PortalRole.ROLE_PORTAL_SUPERADMIN,
-        }.intersection(current_user.roles):
-            return False
-    if (
-        PortalRole.ROLE_PORTAL_SUPERADMIN in target_user.roles 
-        and PortalRole.ROLE_PORTAL_ADMIN in current_user.roles 
-    ):
-        return False
-    if PortalRole.ROLE_PORTAL_ADMIN in target_user.roles and PortalRole.ROLE_PORTAL_ADMIN in current_user.roles:
-        return False 
-    return True
+async def _update_user_if_permitted(
+        updated_user_params: dict, user_id: UUID, current_user: UserSnapshot, session
+) -> MutationResult:
+    _check_actor(current_user)
+    user_dal = UserDAL(session)
+    result = await user_dal.update_user_if_permitted(
+        user_id=user_id,
+        actor_id=current_user.user_id,
+        actor_is_admin=current_user.is_admin,
+        **updated_user_params)
+    if result.status == MutationStatus.UPDATED:
+        on_commit(session, lambda: user_cache.invalidate_user(user_id))
+        if "email" in updated_user_params:
+            on_commit(session, lambda: email_filter.add(updated_user_params["email"]))
+    return result
@@ -1,81 +1,135 @@
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Query, Request, status
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError
 from uuid import UUID
+from typing import Optional
 from logging import getLogger
 from datetime import timedelta
-from src.api.handlers.users.user import user_router, _create_new_user, _delete_user, _get_user_by_id, _update_user, check_user_permissions
+from src.api.handlers.users.user import user_router, _create_new_user, _delete_user, _get_user_by_id, _get_users_by_ids, _update_user, _update_user_if_permitted, _create_users_bulk, _iter_bulk_records, _list_users, _export_users, ExportFormat, EXPORT_MEDIA_TYPES
 from src.api.handlers.auth.auth import login_router, authenticate_user, create_access_token, get_current_user_from_token
-from src.api.models import UserCreate, DeletedUserResponse, ShowUser, UpdatedUserResponse, UpdatedUserRequest, Token
-from src.db.session import get_db
-from src.db.models import User
+from src.api.handlers.auth.auth import create_token_pair, refresh_token_pair
+from src.api.handlers.auth.cache import UserSnapshot
+from src.api.handlers.service.service import service_router, metrics_router, _get_pool_status, _get_metrics
+from src.api.responses import ModelResponse
+from src.api.models import UserCreate, DeletedUserResponse, ShowUser, UpdatedUserResponse, UpdatedUserRequest, Token, RefreshTokenRequest, PoolStatus, ReadinessStatus, BulkUserCreateResponse, UserPage, UserBatch, PortalRoleName
+from src.db.session import get_db, get_read_db, recent_writes
+from src.db.dals import MutationStatus
+from src.db.models import PortalRole
 from src.settings import ACCESS_TOKEN_EXPIRE_MINUTES
+from src.config import USER_LIST_DEFAULT_PAGE_SIZE, USER_LIST_MAX_PAGE_SIZE, AUTH_CLAIMS_TOKENS
 
 logger = getLogger(__name__)
 
 # User 
 @user_router.post("/", response_model=ShowUser)
-async def create_user(body: UserCreate, db: AsyncSession = Depends(get_db)) -> ShowUser: 
-    return await _create_new_user(body, db)
+async def create_user(body: UserCreate, db: AsyncSession = Depends(get_db)) -> ModelResponse: 
+    return ModelResponse(await _create_new_user(body, db))
+
+@user_router.post("/bulk", response_model=BulkUserCreateResponse)
+async def create_users_bulk(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    current_user: UserSnapshot = Depends(get_current_user_from_token),
+) -> ModelResponse:
+    """Accepts a JSON array or an NDJSON stream (Content-Type: application/x-ndjson) of UserCreate records"""
+    if current_user is None or not (current_user.is_admin or current_user.is_superadmin):
+        raise HTTPException(status_code=403, detail="Forbidden")
+    return ModelResponse(await _create_users_bulk(_iter_bulk_records(request), db))
 
 @user_router.delete("/", response_model=DeletedUserResponse)
 async def delete_user(
     user_id: UUID, 
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user_from_token),
-    ) -> DeletedUserResponse: 
-        user_to_delete = await _get_user_by_id(user_id, db)
-        if user_to_delete is None: 
+    current_user: UserSnapshot = Depends(get_current_user_from_token),
+    ) -> ModelResponse: 
+        result = await _delete_user(user_id, current_user, db)
+        if result.status == MutationStatus.NOT_FOUND: 
             raise HTTPException(status_code=404, detail=f"User with id {user_id} not found")
-        if not check_user_permissions(
-             target_user=user_to_delete, 
-             current_user=current_user
-        ): 
-            raise HTTPException(status_code=403, detail=f"Forbidden")             
-        deleted_user_id = await _delete_user(user_id, db)
-        if deleted_user_id is None: 
-            raise HTTPException(status_code=404, detail=f"User with id {user_id} not found")
-        return DeletedUserResponse(delete_user_id=deleted_user_id)
+        if result.status == MutationStatus.FORBIDDEN: 
+            raise HTTPException(status_code=403, detail="Forbidden")             
+        return ModelResponse(DeletedUserResponse(delete_user_id=result.user_id))
 
 @user_router.get("/", response_model=ShowUser)
 async def get_user_by_id(
     user_id: UUID, 
-    db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user_from_token)
-    ) -> ShowUser: 
+    db: AsyncSession = Depends(get_read_db),
+    current_user: UserSnapshot = Depends(get_current_user_from_token)
+    ) -> ModelResponse: 
         user_info = await _get_user_by_id(user_id, db)
         if user_info is None: 
             raise HTTPException(status_code=404, detail=f"User with id {user_id} not found")
-        return user_info
+        return ModelResponse(ShowUser.from_user(user_info))
+
+@user_router.get("/batch", response_model=UserBatch)
+async def get_users_by_ids(
+    ids: list[UUID] = Query(..., description="repeat the parameter: ?ids=...&ids=..."),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: UserSnapshot = Depends(get_current_user_from_token),
+    ) -> ModelResponse:
+        """Found users in request order plus the ids that do not exist, one query for the whole batch"""
+        return ModelResponse(await _get_users_by_ids(ids, db))
+
+@user_router.get("/list", response_model=UserPage)
+async def list_users(
+    cursor: Optional[str] = None,
+    limit: int = Query(USER_LIST_DEFAULT_PAGE_SIZE, ge=1, le=USER_LIST_MAX_PAGE_SIZE),
+    is_active: Optional[bool] = None,
+    role: Optional[PortalRoleName] = None,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: UserSnapshot = Depends(get_current_user_from_token),
+    ) -> ModelResponse:
+        if current_user is None or not (current_user.is_admin or current_user.is_superadmin):
+            raise HTTPException(status_code=403, detail="Forbidden")
+        return ModelResponse(await _list_users(
+            db, limit=limit, cursor=cursor, is_active=is_active, role=PortalRole[role.value] if role else None
+        ))
+
+@user_router.get("/export")
+async def export_users(
+    format: ExportFormat = ExportFormat.NDJSON,
+    after: Optional[UUID] = None,
+    current_user: UserSnapshot = Depends(get_current_user_from_token),
+    ) -> StreamingResponse:
+        """Streams all users ordered by user_id; pass the last user_id received as `after` to resume"""
+        if current_user is None or not (current_user.is_admin or current_user.is_superadmin):
+            raise HTTPException(status_code=403, detail="Forbidden")
+        return StreamingResponse(
+            _export_users(format, after_user_id=after),
+            media_type=EXPORT_MEDIA_TYPES[format],
+            headers={"Content-Disposition": f"attachment; filename=users.{format.value}"},
+        )
 
 @user_router.patch("/", response_model=UpdatedUserResponse)
 async def update_user(
     user_id: UUID, body: UpdatedUserRequest,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user_from_token)
-    ) -> UpdatedUserResponse: 
+    current_user: UserSnapshot = Depends(get_current_user_from_token)
+    ) -> ModelResponse: 
         updated_user_params = body.model_dump(exclude_none=True)
         if updated_user_params == {}:
             raise HTTPException(status_code=422, detail="At least one parameter for user update info should be provided")
-        user_for_update = await _get_user_by_id(user_id, db)
-        if user_for_update is None:
-            raise HTTPException(status_code=404, detail=f"User with id {user_id} not found.")
-        if not check_user_permissions(target_user=user_for_update, current_user=current_user):
-                raise HTTPException(status_code=403, detail="Forbidden")
         try:
-            updated_user_id = await _update_user(updated_user_params=updated_user_params, session=db, user_id=user_id)
-            return UpdatedUserResponse(updated_user_id=updated_user_id)
+            result = await _update_user_if_permitted(
+                updated_user_params=updated_user_params, user_id=user_id, current_user=current_user, session=db
+            )
         except IntegrityError as err: 
             logger.error(err)
+            raise HTTPException(status_code=503, detail=f"Database error: {err}")
+        if result.status == MutationStatus.NOT_FOUND:
+            raise HTTPException(status_code=404, detail=f"User with id {user_id} not found.")
+        if result.status == MutationStatus.FORBIDDEN:
+                raise HTTPException(status_code=403, detail="Forbidden")
+        return ModelResponse(UpdatedUserResponse(updated_user_id=result.user_id))
 ### Roles ###
 
 @user_router.patch("/admin_privilege", response_model=UpdatedUserResponse)
 async def give_admin_privilege(
     user_id: UUID, 
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user_from_token),
-) -> UpdatedUserResponse:  
+    current_user: UserSnapshot = Depends(get_current_user_from_token),
+) -> ModelResponse:  
     if current_user.user_id == user_id: 
         raise HTTPException(status_code=400, detail=f"Cannot manage privilege to itself")
     if not current_user.is_superadmin: 
@@ -95,15 +149,15 @@ async def give_admin_privilege(
     except IntegrityError as err: 
         logger.error(err)
         raise HTTPException(status_code=503, detail=f"Database error: {err}")
-    return UpdatedUserResponse(updated_user_id=updated_user_id)
+    return ModelResponse(UpdatedUserResponse(updated_user_id=updated_user_id))
 
 
 @user_router.delete("/admin_privilege", response_model=UpdatedUserResponse)
 async def revoke_admin_privilege(
     user_id: UUID, 
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user_from_token),
-) -> UpdatedUserResponse:  
+    current_user: UserSnapshot = Depends(get_current_user_from_token),
+) -> ModelResponse:  
     if current_user.user_id == user_id: 
         raise HTTPException(status_code=400, detail=f"Cannot manage privilege to itself")
     if not current_user.is_superadmin: 
@@ -123,20 +177,47 @@ async def revoke_admin_privilege(
     except IntegrityError as err: 
         logger.error(err)
         raise HTTPException(status_code=503, detail=f"Database error: {err}")
-    return UpdatedUserResponse(updated_user_id=updated_user_id)
+    return ModelResponse(UpdatedUserResponse(updated_user_id=updated_user_id))
 
 ### Login ###
 @login_router.post('/token', response_model=Token)
-async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)) -> ModelResponse:
     user = await authenticate_user(form_data.username, form_data.password, db)
     if not user: 
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, 
             detail="Incorrect username or password",
         )
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data = {"sub": user.email, "other_custom_data": [1, 2, 3, 4]}, expires_delta=access_token_expires       
-    )
-    return {"access_token": access_token, "token_type": "bearer"}
+    if AUTH_CLAIMS_TOKENS:
+        token = create_token_pair(user)
+    else:
+        access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+        access_token = create_access_token(
+            data = {"sub": user.email, "other_custom_data": [1, 2, 3, 4]}, expires_delta=access_token_expires       
+        )
+        token = Token(access_token=access_token, token_type="bearer")
+    # the account may be younger than the replica lag, first requests with the token read the primary
+    recent_writes.mark(f"Bearer {token.access_token}")
+    return ModelResponse(token, exclude_none=True)
+
+@login_router.post("/refresh", response_model=Token)
+async def refresh_access_token(body: RefreshTokenRequest, db: AsyncSession = Depends(get_db)) -> ModelResponse:
+    """Exchanges a refresh token from /login/token (claims mode only) for a new token pair"""
+    if not AUTH_CLAIMS_TOKENS:
+        raise HTTPException(status_code=404, detail="Refresh tokens are not enabled")
+    return ModelResponse(await refresh_token_pair(body.refresh_token, db))
+
+### Service ###
+@service_router.get("/ready", response_model=ReadinessStatus)
+async def get_readiness(request: Request) -> ModelResponse:
+    """200 once the worker has warmed its pools and hasher, 503 before that and while shutting down"""
+    ready = getattr(request.app.state, "ready", False)
+    return ModelResponse(ReadinessStatus(ready=ready), status_code=200 if ready else 503)
+
+@service_router.get("/db_pool", response_model=PoolStatus)
+async def get_db_pool_status() -> ModelResponse:
+    return ModelResponse(_get_pool_status())
 
+@metrics_router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics() -> PlainTextResponse:
+    return PlainTextResponse(_get_metrics(), media_type="text/plain; version=0.0.4")
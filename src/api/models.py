@@ -1,8 +1,10 @@
 import re 
 import uuid 
+from enum import Enum
 from fastapi import HTTPException 
 from pydantic import BaseModel, EmailStr, field_validator, Field, ConfigDict
 from typing import Optional
+from src.db.models import PortalRole, normalize_email
 
 
 LETTER_MATCH_PATTERN = re.compile(r"^[a-zA-Zа-яА-Я\-]+$")
@@ -23,12 +25,38 @@ class ShowUser(TunedModel):
     email: EmailStr
     is_active: bool 
 
+    @classmethod
+    def from_user(cls, user) -> "ShowUser":
+        """Без повторной валидации: данные из БД уже проверены при записи"""
+        return cls.model_construct(
+            user_id=user.user_id,
+            name=user.name,
+            surname=user.surname,
+            email=user.email,
+            is_active=user.is_active,
+        )
+
+class UserPage(BaseModel):
+    users: list[ShowUser]
+    next_cursor: Optional[str] = None
+
+class UserBatch(BaseModel):
+    users: list[ShowUser]
+    missing: list[uuid.UUID]
+
+# role names accepted in query parameters, PortalRole itself is stored as bit flags
+PortalRoleName = Enum("PortalRoleName", {role.name: role.name for role in PortalRole}, type=str)
+
 class UserCreate(BaseModel): 
     name: str
     surname: str
     email: EmailStr
     password: str
 
+    @field_validator("email")
+    def validate_email(cls, value):
+        return normalize_email(value)
+
     @field_validator("name")
     def validate_name(cls, value): 
         if not LETTER_MATCH_PATTERN.match(value): 
@@ -52,6 +80,10 @@ class UpdatedUserRequest(BaseModel):
     surname: Optional[str] = Field(None, min_length=1)
     email: Optional[EmailStr] = Field(None, min_length=1) 
 
+    @field_validator("email")
+    def validate_email(cls, value):
+        return normalize_email(value) if value is not None else value
+
     @field_validator("name")
     def validate_name(cls, value): 
         if not LETTER_MATCH_PATTERN.match(value): 
@@ -68,7 +100,43 @@ class UpdatedUserRequest(BaseModel):
             )
         return value
     
+class BulkUserStatus(str, Enum):
+    CREATED = "created"
+    DUPLICATE = "duplicate"
+    INVALID = "invalid"
+
+class BulkUserResult(BaseModel):
+    index: int
+    status: BulkUserStatus
+    email: Optional[str] = None
+    user_id: Optional[uuid.UUID] = None
+    detail: Optional[str] = None
+
+class BulkUserCreateResponse(BaseModel):
+    created: int
+    duplicates: int
+    invalid: int
+    results: list[BulkUserResult]
+
 # Login 
 class Token(BaseModel): 
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
+
+class RefreshTokenRequest(BaseModel):
+    refresh_token: str
+
+# Service
+class ReadinessStatus(BaseModel):
+    ready: bool
+
+class PoolStatus(BaseModel):
+    size: int
+    checked_out: int
+    idle: int
+    overflow: int
+    max_overflow: Optional[int] = None
+    checkouts: Optional[int] = None
+    wait_seconds_total: Optional[float] = None
+    wait_seconds_max: Optional[float] = None
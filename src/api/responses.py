@@ -0,0 +1,21 @@
+from fastapi.responses import Response
+from pydantic import BaseModel
+from src.metrics import timed
+
+
+class ModelResponse(Response):
+    """JSON body written straight from a pydantic model by its compiled serializer.
+
+    Returning a Response makes FastAPI skip its own response_model pass
+    (validate -> jsonable dict -> json.dumps), so the model is serialized
+    exactly once. Keep `response_model=` on the route for the OpenAPI schema.
+    """
+    media_type = "application/json"
+
+    def __init__(self, content: BaseModel, *args, exclude_none: bool = False, **kwargs):
+        self.exclude_none = exclude_none
+        super().__init__(content, *args, **kwargs)
+
+    def render(self, content: BaseModel) -> bytes:
+        with timed("serialize"):
+            return content.__pydantic_serializer__.to_json(content, exclude_none=self.exclude_none)
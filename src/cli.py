@@ -0,0 +1,128 @@
+"""Management commands.
+
+    python -m src.cli calibrate-bcrypt [--target-ms 250]
+    python -m src.cli serve [--workers N] [--host HOST] [--port PORT]
+    python -m src.cli archive-users [--retention-days N] [--batch-size N]
+    python -m src.cli dedupe-emails [--apply]
+"""
+import argparse
+import asyncio
+import os
+
+import uvicorn
+
+from src.api.handlers.auth.hasher import calibrate_bcrypt_rounds, measure_bcrypt_ms
+from src.config import BCRYPT_TARGET_MS, BCRYPT_MIN_ROUNDS, BCRYPT_MAX_ROUNDS
+from src.config import BCRYPT_ROUNDS, BCRYPT_CALIBRATE_ON_STARTUP
+from src.config import SERVER_HOST, SERVER_PORT, SERVER_WORKERS, SERVER_GRACEFUL_TIMEOUT
+from src.config import USER_ARCHIVE_RETENTION_DAYS, USER_ARCHIVE_BATCH_SIZE
+
+
+def calibrate_bcrypt(args: argparse.Namespace) -> None:
+    rounds = calibrate_bcrypt_rounds(args.target_ms, min_rounds=args.min_rounds, max_rounds=args.max_rounds)
+    print(f"bcrypt cost {rounds} takes {measure_bcrypt_ms(rounds):.0f} ms per hash on this machine")
+    print(f"BCRYPT_ROUNDS={rounds}")
+
+
+def serve(args: argparse.Namespace) -> None:
+    """Runs `args.workers` uvicorn worker processes.
+
+    Each worker runs the app lifespan: it warms up in the background
+    (/service/ready is 503 until then), and on SIGTERM stops accepting,
+    waits up to `--graceful-timeout` seconds for in-flight requests and then
+    disposes its engines.
+    """
+    if BCRYPT_CALIBRATE_ON_STARTUP and BCRYPT_ROUNDS is None:
+        # measured once here, before the workers compete for the cpus: each worker
+        # calibrating on its own could pick a different cost than the others
+        rounds = calibrate_bcrypt_rounds(BCRYPT_TARGET_MS)
+        os.environ["BCRYPT_ROUNDS"] = str(rounds)
+        print(f"bcrypt cost calibrated to {rounds} rounds for a {BCRYPT_TARGET_MS:g} ms budget")
+    if "HASHER_MAX_WORKERS" not in os.environ:
+        # every worker has its own bcrypt pool, together they should not oversubscribe the cpus
+        os.environ["HASHER_MAX_WORKERS"] = str(max(1, (os.cpu_count() or 1) // args.workers))
+    uvicorn.run(
+        "src.main:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        timeout_graceful_shutdown=args.graceful_timeout,
+        proxy_headers=True,
+    )
+
+
+def archive_users(args: argparse.Namespace) -> None:
+    from src.db.archive import archive_deactivated_users
+    from src.db.session import engine
+
+    async def run() -> int:
+        try:
+            return await archive_deactivated_users(args.retention_days, args.batch_size)
+        finally:
+            await engine.dispose()
+
+    archived = asyncio.run(run())
+    print(f"archived {archived} users deactivated more than {args.retention_days:g} days ago")
+
+
+def dedupe_emails(args: argparse.Namespace) -> None:
+    """Lists accounts whose emails differ only in case, and with --apply retires all but one per email.
+
+    Run it before `alembic upgrade` past 101e99cd84ba (unique index on
+    lower(email)), which refuses to run while such accounts exist.
+    """
+    from src.db.duplicates import find_duplicate_emails, retire_duplicate_emails
+    from src.db.session import engine
+
+    async def run() -> None:
+        try:
+            async with engine.begin() as connection:
+                duplicates = await find_duplicate_emails(connection)
+                for duplicate in duplicates:
+                    retired = ", ".join(str(user_id) for user_id in duplicate.retired)
+                    print(f"{duplicate.email}: keep {duplicate.kept}, retire {retired}")
+                if not duplicates:
+                    print("no emails differing only in case")
+                elif args.apply:
+                    count = await retire_duplicate_emails(connection, duplicates)
+                    print(f"retired {count} accounts: deactivated, email suffixed with #duplicate-<user_id>")
+                else:
+                    print("dry run, pass --apply to retire the accounts listed")
+        finally:
+            await engine.dispose()
+
+    asyncio.run(run())
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m src.cli")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    calibrate = commands.add_parser("calibrate-bcrypt", help="pick the bcrypt cost for a per-hash latency budget")
+    calibrate.add_argument("--target-ms", type=float, default=BCRYPT_TARGET_MS)
+    calibrate.add_argument("--min-rounds", type=int, default=BCRYPT_MIN_ROUNDS)
+    calibrate.add_argument("--max-rounds", type=int, default=BCRYPT_MAX_ROUNDS)
+    calibrate.set_defaults(handler=calibrate_bcrypt)
+
+    server = commands.add_parser("serve", help="run the production server with several workers")
+    server.add_argument("--host", default=SERVER_HOST)
+    server.add_argument("--port", type=int, default=SERVER_PORT)
+    server.add_argument("--workers", type=int, default=SERVER_WORKERS)
+    server.add_argument("--graceful-timeout", type=float, default=SERVER_GRACEFUL_TIMEOUT)
+    server.set_defaults(handler=serve)
+
+    archive = commands.add_parser("archive-users", help="move long-deactivated users into users_archive")
+    archive.add_argument("--retention-days", type=float, default=USER_ARCHIVE_RETENTION_DAYS)
+    archive.add_argument("--batch-size", type=int, default=USER_ARCHIVE_BATCH_SIZE)
+    archive.set_defaults(handler=archive_users)
+
+    dedupe = commands.add_parser("dedupe-emails", help="retire accounts whose emails differ only in case")
+    dedupe.add_argument("--apply", action="store_true", help="change the database, only list the accounts without it")
+    dedupe.set_defaults(handler=dedupe_emails)
+
+    args = parser.parse_args(argv)
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,14 @@ import os
 
 load_dotenv()
 
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
 DB_HOST = os.environ.get("DB_HOST")
 DB_PORT = os.environ.get("DB_PORT")
 DB_NAME = os.environ.get("DB_NAME")
@@ -16,3 +24,105 @@ DB_PORT_TEST = os.environ.get("DB_PORT_TEST")
 DB_NAME_TEST = os.environ.get("DB_NAME_TEST")
 DB_PASS_TEST = os.environ.get("DB_PASS_TEST")
 DB_USER_TEST = os.environ.get("DB_USER_TEST")
+
+# Password hashing
+
+HASHER_POOL_KIND = os.environ.get("HASHER_POOL_KIND", "process")
+HASHER_MAX_WORKERS = int(os.environ.get("HASHER_MAX_WORKERS", os.cpu_count() or 1))
+HASHER_MAX_PENDING = int(os.environ.get("HASHER_MAX_PENDING", 256))
+HASHER_TIMEOUT = float(os.environ.get("HASHER_TIMEOUT", 5))
+
+# Auth cache
+
+AUTH_CACHE_MAXSIZE = int(os.environ.get("AUTH_CACHE_MAXSIZE", 10000))
+AUTH_CACHE_TTL = float(os.environ.get("AUTH_CACHE_TTL", 60))
+
+# Database engine
+
+DB_ECHO = _env_bool("DB_ECHO", False)
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", 1800))
+# pool_recycle already retires connections before server/proxy idle timeouts drop them,
+# pre-ping would add a round trip to every checkout; turn it on for flaky networks
+DB_POOL_PRE_PING = _env_bool("DB_POOL_PRE_PING", False)
+DB_STATEMENT_CACHE_SIZE = int(os.environ.get("DB_STATEMENT_CACHE_SIZE", 100))
+# 0 disables the slow query log / the per-request statement budget
+DB_SLOW_QUERY_MS = float(os.environ.get("DB_SLOW_QUERY_MS", 200))
+DB_QUERY_BUDGET = int(os.environ.get("DB_QUERY_BUDGET", 20))
+# concurrent identical UserDAL lookups in a worker share one query
+DB_COALESCE_READS = _env_bool("DB_COALESCE_READS", True)
+
+# Read replica, reads stay on the primary when it is not set
+
+DATABASE_READ_URL = os.environ.get("DATABASE_READ_URL") or None
+DB_READ_POOL_SIZE = int(os.environ.get("DB_READ_POOL_SIZE", DB_POOL_SIZE))
+# how long a client's reads keep going to the primary after it wrote something
+DB_REPLICA_LAG_SECONDS = float(os.environ.get("DB_REPLICA_LAG_SECONDS", 2))
+
+# LISTEN user_changed: evicts per-worker caches when any worker changes a user
+
+USER_CHANGE_LISTENER_ENABLED = _env_bool("USER_CHANGE_LISTENER_ENABLED", True)
+USER_CHANGE_LISTENER_STARTUP_TIMEOUT = float(os.environ.get("USER_CHANGE_LISTENER_STARTUP_TIMEOUT", 5))
+
+# Bulk user creation
+
+BULK_CHUNK_SIZE = int(os.environ.get("BULK_CHUNK_SIZE", 500))
+
+# User listing
+
+USER_LIST_DEFAULT_PAGE_SIZE = int(os.environ.get("USER_LIST_DEFAULT_PAGE_SIZE", 50))
+USER_LIST_MAX_PAGE_SIZE = int(os.environ.get("USER_LIST_MAX_PAGE_SIZE", 500))
+
+# User batch lookup
+
+USER_BATCH_MAX_SIZE = int(os.environ.get("USER_BATCH_MAX_SIZE", 100))
+
+# Archival of deactivated users (python -m src.cli archive-users, or the
+# optional scheduled task of every worker when USER_ARCHIVE_ENABLED is set)
+
+USER_ARCHIVE_ENABLED = _env_bool("USER_ARCHIVE_ENABLED", False)
+USER_ARCHIVE_RETENTION_DAYS = float(os.environ.get("USER_ARCHIVE_RETENTION_DAYS", 90))
+USER_ARCHIVE_BATCH_SIZE = int(os.environ.get("USER_ARCHIVE_BATCH_SIZE", 1000))
+USER_ARCHIVE_INTERVAL_SECONDS = float(os.environ.get("USER_ARCHIVE_INTERVAL_SECONDS", 3600))
+
+# User export
+
+USER_EXPORT_BATCH_SIZE = int(os.environ.get("USER_EXPORT_BATCH_SIZE", 1000))
+
+# Bcrypt cost
+
+BCRYPT_ROUNDS = int(os.environ["BCRYPT_ROUNDS"]) if os.environ.get("BCRYPT_ROUNDS") else None
+BCRYPT_TARGET_MS = float(os.environ.get("BCRYPT_TARGET_MS", 250))
+BCRYPT_MIN_ROUNDS = int(os.environ.get("BCRYPT_MIN_ROUNDS", 10))
+BCRYPT_MAX_ROUNDS = int(os.environ.get("BCRYPT_MAX_ROUNDS", 16))
+BCRYPT_CALIBRATE_ON_STARTUP = _env_bool("BCRYPT_CALIBRATE_ON_STARTUP", False)
+
+# Negative lookup filter for emails
+
+EMAIL_FILTER_ENABLED = _env_bool("EMAIL_FILTER_ENABLED", False)
+EMAIL_FILTER_ERROR_RATE = float(os.environ.get("EMAIL_FILTER_ERROR_RATE", 0.01))
+EMAIL_FILTER_MIN_CAPACITY = int(os.environ.get("EMAIL_FILTER_MIN_CAPACITY", 100000))
+# the filter is built at startup and on every listener reconnect, the user_changed feed keeps it
+# current in between; a periodic full rebuild (0 = never) only sheds bits of changed emails
+EMAIL_FILTER_REFRESH_SECONDS = float(os.environ.get("EMAIL_FILTER_REFRESH_SECONDS", 0))
+
+# Request timing and metrics
+
+METRICS_ENABLED = _env_bool("METRICS_ENABLED", True)
+SERVER_TIMING_ENABLED = _env_bool("SERVER_TIMING_ENABLED", True)
+
+# Production launcher (python -m src.cli serve)
+
+SERVER_HOST = os.environ.get("SERVER_HOST", "0.0.0.0")
+SERVER_PORT = int(os.environ.get("SERVER_PORT", 8000))
+SERVER_WORKERS = int(os.environ.get("SERVER_WORKERS", os.cpu_count() or 1))
+SERVER_GRACEFUL_TIMEOUT = float(os.environ.get("SERVER_GRACEFUL_TIMEOUT", 30))
+
+# Opt-in claims tokens: short-lived access tokens carry user_id, roles and the
+# token version, refreshed through /login/refresh, so auth needs no db lookup
+
+AUTH_CLAIMS_TOKENS = _env_bool("AUTH_CLAIMS_TOKENS", False)
+CLAIMS_ACCESS_TOKEN_EXPIRE_MINUTES = float(os.environ.get("CLAIMS_ACCESS_TOKEN_EXPIRE_MINUTES", 5))
+REFRESH_TOKEN_EXPIRE_DAYS = float(os.environ.get("REFRESH_TOKEN_EXPIRE_DAYS", 14))
@@ -0,0 +1,37 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from logging import getLogger
+from src.db.dals import UserDAL
+from src.db.session import async_session, unit_of_work
+from src.config import USER_ARCHIVE_RETENTION_DAYS, USER_ARCHIVE_BATCH_SIZE, USER_ARCHIVE_INTERVAL_SECONDS
+
+logger = getLogger(__name__)
+
+
+async def archive_deactivated_users(
+        retention_days: float = USER_ARCHIVE_RETENTION_DAYS, batch_size: int = USER_ARCHIVE_BATCH_SIZE
+) -> int:
+    """Moves users deactivated more than `retention_days` ago into users_archive, returns how many.
+
+    Every batch is its own short transaction, so row locks and the WAL burst
+    stay bounded and logins are never blocked behind one long delete.
+    """
+    deactivated_before = datetime.now(timezone.utc) - timedelta(days=retention_days)
+    archived = 0
+    while True:
+        async with unit_of_work(async_session()) as session:
+            moved = await UserDAL(session).archive_deactivated_users(deactivated_before, batch_size)
+        archived += moved
+        if moved < batch_size:
+            return archived
+
+
+async def archive_periodically(interval: float = USER_ARCHIVE_INTERVAL_SECONDS) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            archived = await archive_deactivated_users()
+            if archived:
+                logger.info("Archived %s deactivated users", archived)
+        except Exception as err:
+            logger.warning("User archival failed: %s", err)
@@ -0,0 +1,64 @@
+import asyncio
+from typing import Awaitable, Callable, Hashable, TypeVar
+from sqlalchemy.ext.asyncio import AsyncSession
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Concurrent calls with the same key share one execution.
+
+    The first caller (the leader) runs `call`; callers arriving while it is
+    in flight wait for its result instead of running their own. If the
+    leader fails or is cancelled nothing is shared: every waiting caller
+    runs `call` itself, so an error tied to the leader's connection or a
+    client that went away never leaks into other requests.
+    """
+    def __init__(self):
+        self._inflight: dict[Hashable, asyncio.Future] = {}
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    def forget(self) -> None:
+        """Later callers start new executions instead of joining the ones in flight, which still finish"""
+        self._inflight.clear()
+
+    async def do(self, key: Hashable, call: Callable[[], Awaitable[T]]) -> tuple[T, bool]:
+        """Returns (result, shared): `shared` is True when the result came from another caller"""
+        future = self._inflight.get(key)
+        if future is not None:
+            try:
+                return await asyncio.shield(future), True
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    # this caller was cancelled, not the leader
+                    raise
+            return await call(), False
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await call()
+        except BaseException:
+            future.cancel()
+            raise
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+        future.set_result(result)
+        return result, False
+
+
+def can_share_reads(session: AsyncSession) -> bool:
+    """Whether a lookup through `session` may take a result read by another session.
+
+    True for sessions bound to the read-only replica engine, and for sessions
+    with nothing of their own to read back: no transaction begun yet and no
+    pending objects to autoflush. A session that already ran statements may
+    have written rows only its own transaction can see, so it always queries.
+    """
+    bind = session.bind
+    if bind is not None and bind.sync_engine.get_execution_options().get("postgresql_readonly"):
+        return True
+    return not session.in_transaction() and not (session.new or session.dirty or session.deleted)
@@ -1,21 +1,76 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import Union
-from sqlalchemy import update, and_, select
+from enum import Enum
+from typing import AsyncIterator, Awaitable, Callable, Hashable, NamedTuple, Optional, Union
+from sqlalchemy import update, delete, and_, not_, select, true, bindparam, func, any_, Row, ColumnElement
+from sqlalchemy.dialects.postgresql import insert, ARRAY, UUID as PG_UUID
+from datetime import datetime
 from uuid import UUID
-from src.db.models import User 
-from src.db.models import PortalRole
+from src.db.models import User, UserArchive
+from src.db.models import PortalRole, normalize_email
+from src.db.coalesce import SingleFlight, can_share_reads
+from src.metrics import timed_methods, coalesced_reads
+from src.config import DB_COALESCE_READS
 
+# Hot lookups (every login and every authenticated request) are built once: executing the same
+# statement object reuses its memoized cache key and compiled SQL, and the identical SQL string
+# hits asyncpg's per-connection prepared statement cache (DB_STATEMENT_CACHE_SIZE).
+USER_BY_ID_QUERY = select(User).where(User.user_id == bindparam("user_id"))
+USER_BY_EMAIL_QUERY = select(User).where(func.lower(User.email) == bindparam("email"))
+# one array parameter instead of IN (...): the same SQL (and prepared statement) for any batch size
+USERS_BY_IDS_QUERY = select(User).where(User.user_id == any_(bindparam("user_ids", type_=ARRAY(PG_UUID(as_uuid=True)))))
+
+# In-flight point lookups of this worker: the burst of requests a client sends with one token
+# right after login all resolve the same user, and share a single query
+_user_lookups = SingleFlight()
+
+
+def forget_inflight_lookups() -> None:
+    """Called when a user changes: a lookup in flight may have read the old row"""
+    _user_lookups.forget()
+
+
+class MutationStatus(str, Enum):
+    UPDATED = "updated"
+    NOT_FOUND = "not_found"
+    FORBIDDEN = "forbidden"
+
+class MutationResult(NamedTuple):
+    status: MutationStatus
+    user_id: Optional[UUID] = None
+
+# changes that must invalidate refresh tokens, whose claims are built from these columns
+TOKEN_CLAIM_COLUMNS = frozenset(("email", "roles", "is_active"))
+
+
+def _bump_token_version(values: dict) -> dict:
+    if TOKEN_CLAIM_COLUMNS.isdisjoint(values):
+        return values
+    return {**values, "token_version": User.token_version + 1}
+
+
+def _stamp_deactivation(values: dict) -> dict:
+    if "is_active" not in values:
+        return values
+    return {**values, "deactivated_at": None if values["is_active"] else func.now()}
+
+
+def _update_values(values: dict) -> dict:
+    """Columns derived from an update: the token version and the deactivation time"""
+    return _bump_token_version(_stamp_deactivation(values))
+
+
+@timed_methods("db")
 class UserDAL: 
     def __init__(self, db_session: AsyncSession): 
         self.db_session = db_session
     
     async def create_user(
-            self, name: str, surname: str, email: str, hashed_password: str, roles: list[PortalRole]
+            self, name: str, surname: str, email: str, hashed_password: str, roles: PortalRole
     ) -> User: 
         new_user = User(
             name=name, 
             surname=surname, 
-            email=email,
+            email=normalize_email(email),
             hashed_password=hashed_password,
             roles=roles
         )
@@ -23,36 +78,200 @@ class UserDAL:
         await self.db_session.flush()
         return new_user
     
-    async def delete_user(self, user_id: UUID) -> Union[UUID, None]:
-        query = update(User). \
-            where(and_(User.user_id == user_id, User.is_active == True)). \
-            values(is_active=False). \
-            returning(User.user_id)
+    async def create_users(self, users: list[dict]) -> dict[str, UUID]:
+        """Multi-row insert that skips emails already taken, returns email -> user_id of inserted rows"""
+        if not users:
+            return {}
+        query = insert(User). \
+            values(users). \
+            on_conflict_do_nothing(index_elements=[func.lower(User.email)]). \
+            returning(func.lower(User.email), User.user_id)
         response = await self.db_session.execute(query)
-        deleted_user_id = response.fetchone()
-        if deleted_user_id is not None: 
-            return deleted_user_id[0]
+        return {email: user_id for email, user_id in response.fetchall()}
 
-    async def get_user_by_id(self, user_id: UUID) -> Union[User, None]: 
-        query = select(User).where(User.user_id == user_id)
+    async def get_existing_emails(self, emails: list[str]) -> set[str]:
+        if not emails:
+            return set()
+        normalized_emails = [normalize_email(email) for email in emails]
+        query = select(func.lower(User.email)).where(func.lower(User.email).in_(normalized_emails))
         response = await self.db_session.execute(query)
+        return set(response.scalars().all())
+
+    @staticmethod
+    def _managed_by(actor_id: UUID, actor_is_admin: bool) -> ColumnElement[bool]:
+        """Whether the actor may delete or update a user, for a known non-superadmin actor.
+
+        Users manage only themselves. Admins manage users without admin or
+        superadmin roles, which excludes themselves. Superadmins are turned
+        away before this (_check_actor).
+        """
+        if actor_is_admin:
+            return not_(User.has_role(PortalRole.ROLE_PORTAL_ADMIN | PortalRole.ROLE_PORTAL_SUPERADMIN))
+        return User.user_id == actor_id
+
+    async def _update_active_user_if_permitted(
+            self, user_id: UUID, actor_id: UUID, actor_is_admin: bool, values: dict
+    ) -> MutationResult:
+        """Checks existence and permissions and applies the update in one statement:
+
+            WITH target AS (SELECT <permitted> FROM users WHERE ...),
+                 changed AS (UPDATE users SET ... WHERE ... AND <permitted> RETURNING user_id)
+            SELECT target.permitted, changed.user_id FROM target LEFT JOIN changed ON true
+        """
+        permitted = self._managed_by(actor_id, actor_is_admin)
+        is_target = and_(User.user_id == user_id, User.is_active == True)
+        target = select(permitted.label("permitted")).where(is_target).cte("target")
+        changed = update(User). \
+            where(is_target, permitted). \
+            values(_update_values(values)). \
+            returning(User.user_id). \
+            cte("changed")
+        query = select(target.c.permitted, changed.c.user_id). \
+            select_from(target.outerjoin(changed, true()))
+        response = await self.db_session.execute(query)
+        row = response.fetchone()
+        if row is None:
+            return MutationResult(MutationStatus.NOT_FOUND)
+        if not row.permitted:
+            return MutationResult(MutationStatus.FORBIDDEN)
+        if row.user_id is None:
+            # permitted in the snapshot, but changed concurrently before the update got the row
+            return MutationResult(MutationStatus.NOT_FOUND)
+        return MutationResult(MutationStatus.UPDATED, row.user_id)
+
+    async def delete_user_if_permitted(self, user_id: UUID, actor_id: UUID, actor_is_admin: bool) -> MutationResult:
+        return await self._update_active_user_if_permitted(
+            user_id, actor_id, actor_is_admin, {"is_active": False}
+        )
+
+    async def update_user_if_permitted(
+            self, user_id: UUID, actor_id: UUID, actor_is_admin: bool, **kwargs
+    ) -> MutationResult:
+        return await self._update_active_user_if_permitted(user_id, actor_id, actor_is_admin, kwargs)
+
+    async def _coalesced(
+            self, method: str, key: Hashable, load: Callable[[], Awaitable[Optional[User]]]
+    ) -> Optional[User]:
+        """Runs `load`, or shares the result of the same lookup already in flight on the same engine"""
+        if not DB_COALESCE_READS or not can_share_reads(self.db_session):
+            coalesced_reads.inc((method, "executed"))
+            return await load()
+        user, shared = await _user_lookups.do((method, self.db_session.bind, key), load)
+        coalesced_reads.inc((method, "coalesced" if shared else "executed"))
+        if shared and user is not None:
+            # the instance belongs to the leader's session, this one gets its own copy without a query
+            user = await self.db_session.merge(user, load=False)
+        return user
+
+    async def get_user_by_id(self, user_id: UUID) -> Union[User, None]: 
+        return await self._coalesced("get_user_by_id", user_id, lambda: self._get_user_by_id(user_id))
+
+    async def _get_user_by_id(self, user_id: UUID) -> Union[User, None]:
+        response = await self.db_session.execute(USER_BY_ID_QUERY, {"user_id": user_id})
         user_row = response.fetchone()
         if user_row is not None: 
             return user_row[0]
 
+    async def get_users_by_ids(self, user_ids: list[UUID]) -> list[User]:
+        if not user_ids:
+            return []
+        response = await self.db_session.execute(USERS_BY_IDS_QUERY, {"user_ids": user_ids})
+        return list(response.scalars().all())
+
     async def update_user(self, user_id: UUID, **kwargs) -> Union[UUID, None]:
         query = update(User). \
             where(and_(User.user_id == user_id, User.is_active == True)). \
-            values(kwargs). \
+            values(_update_values(kwargs)). \
             returning(User.user_id)
         response = await self.db_session.execute(query)
         update_user_id_row = response.fetchone()
         if update_user_id_row is not None:
             return update_user_id_row[0]
         
-    async def get_user_by_email(self, email: str) -> Union[User, None]:
-        query = select(User).where(User.email == email)
+    async def replace_password_hash(self, user_id: UUID, old_hash: str, new_hash: str) -> bool:
+        """Swaps the hash only if the password was not changed meanwhile"""
+        query = update(User). \
+            where(and_(User.user_id == user_id, User.hashed_password == old_hash)). \
+            values(hashed_password=new_hash). \
+            returning(User.user_id)
         response = await self.db_session.execute(query)
+        return response.fetchone() is not None
+
+    async def get_user_by_email(self, email: str) -> Union[User, None]:
+        email = normalize_email(email)
+        return await self._coalesced("get_user_by_email", email, lambda: self._get_user_by_email(email))
+
+    async def _get_user_by_email(self, email: str) -> Union[User, None]:
+        response = await self.db_session.execute(USER_BY_EMAIL_QUERY, {"email": email})
         user_row = response.fetchone()
         if user_row is not None: 
-            return user_row[0]
\ No newline at end of file
+            return user_row[0]
+
+    async def list_users(
+            self,
+            limit: int,
+            after_user_id: Optional[UUID] = None,
+            is_active: Optional[bool] = None,
+            role: Optional[PortalRole] = None,
+    ) -> list[User]:
+        """Keyset page ordered by user_id: cost does not grow with the page number"""
+        query = select(User).order_by(User.user_id).limit(limit)
+        if after_user_id is not None:
+            query = query.where(User.user_id > after_user_id)
+        if is_active is not None:
+            # the bare predicate, not `is_active = $1`, so even a generic plan can use ix_users_active_user_id
+            query = query.where(User.is_active if is_active else not_(User.is_active))
+        if role is not None:
+            query = query.where(User.has_role(role))
+        response = await self.db_session.execute(query)
+        return list(response.scalars().all())
+
+    async def stream_users(self, after_user_id: Optional[UUID] = None, batch_size: int = 1000) -> AsyncIterator[list[Row]]:
+        """Yields batches of (user_id, name, surname, email, is_active) rows from a server-side cursor"""
+        query = select(User.user_id, User.name, User.surname, User.email, User.is_active). \
+            order_by(User.user_id). \
+            execution_options(yield_per=batch_size)
+        if after_user_id is not None:
+            query = query.where(User.user_id > after_user_id)
+        response = await self.db_session.stream(query)
+        async for rows in response.partitions():
+            yield rows
+
+    async def count_users(self) -> int:
+        response = await self.db_session.execute(select(func.count()).select_from(User))
+        return response.scalar_one()
+
+    async def stream_emails(self, batch_size: int = 10000) -> AsyncIterator[list[str]]:
+        query = select(func.lower(User.email)).execution_options(yield_per=batch_size)
+        response = await self.db_session.stream_scalars(query)
+        async for emails in response.partitions():
+            yield emails
+
+    async def archive_deactivated_users(self, deactivated_before: datetime, limit: int) -> int:
+        """Moves up to `limit` users deactivated before `deactivated_before` into users_archive.
+
+        One statement, so a row is never both archived and live:
+
+            WITH moved AS (DELETE FROM users WHERE user_id IN (
+                SELECT user_id FROM users WHERE NOT is_active AND deactivated_at < ...
+                ORDER BY deactivated_at LIMIT ... FOR UPDATE SKIP LOCKED) RETURNING ...)
+            INSERT INTO users_archive (...) SELECT ... FROM moved
+
+        SKIP LOCKED lets several workers run it at once without waiting on each other.
+        """
+        columns = [column.name for column in User.__table__.columns]
+        candidates = select(User.user_id). \
+            where(not_(User.is_active), User.deactivated_at < deactivated_before). \
+            order_by(User.deactivated_at). \
+            limit(limit). \
+            with_for_update(skip_locked=True)
+        moved = delete(User). \
+            where(User.user_id.in_(candidates.scalar_subquery())). \
+            returning(*User.__table__.columns). \
+            cte("moved")
+        query = insert(UserArchive). \
+            from_select(columns, select(*(moved.c[name] for name in columns))). \
+            add_cte(moved). \
+            returning(UserArchive.user_id)
+        response = await self.db_session.execute(query)
+        return len(response.fetchall())
@@ -0,0 +1,44 @@
+from typing import NamedTuple
+from uuid import UUID
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+# Plain SQL over the columns that exist before migration 101e99cd84ba, which
+# refuses to build the unique lower(email) index while such duplicates exist.
+# In every group the account to keep comes first: active, then the most roles.
+DUPLICATE_EMAILS_QUERY = text("""
+    SELECT lower(email) AS email,
+           array_agg(user_id ORDER BY is_active DESC NULLS LAST, roles DESC, user_id) AS user_ids
+    FROM users
+    GROUP BY lower(email)
+    HAVING count(*) > 1
+    ORDER BY lower(email)
+""")
+RETIRE_DUPLICATES_QUERY = text("""
+    UPDATE users
+    SET email = email || '#duplicate-' || user_id::text, is_active = false
+    WHERE user_id = ANY(:user_ids)
+""")
+
+
+class DuplicateEmail(NamedTuple):
+    email: str
+    kept: UUID
+    retired: list[UUID]
+
+
+async def find_duplicate_emails(connection: AsyncConnection) -> list[DuplicateEmail]:
+    response = await connection.execute(DUPLICATE_EMAILS_QUERY)
+    return [DuplicateEmail(email, user_ids[0], list(user_ids[1:])) for email, user_ids in response]
+
+
+async def retire_duplicate_emails(connection: AsyncConnection, duplicates: list[DuplicateEmail]) -> int:
+    """Deactivates every account but the kept one and suffixes its email with its user_id.
+
+    Nothing is deleted: the original address stays readable in the email
+    column, so the accounts can be merged by hand later.
+    """
+    user_ids = [user_id for duplicate in duplicates for user_id in duplicate.retired]
+    if user_ids:
+        await connection.execute(RETIRE_DUPLICATES_QUERY, {"user_ids": user_ids})
+    return len(user_ids)
@@ -1,38 +1,106 @@
 import uuid 
-from enum import Enum
-from sqlalchemy import String, Column, Boolean
-from sqlalchemy.dialects.postgresql import UUID, ARRAY
+from enum import IntFlag
+from typing import Iterable, Union
+from sqlalchemy import String, Column, Boolean, DateTime, Index, Integer, TypeDecorator, func, literal_column, text
+from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import declarative_base
 
 Base = declarative_base()
 
-class PortalRole(str, Enum):
-    ROLE_PORTAL_USER = "ROLE_PORTAL_USER"
-    ROLE_PORTAL_ADMIN = "ROLE_PORTAL_ADMIN"
-    ROLE_PORTAL_SUPERADMIN = "ROLE_PORTAL_SUPERADMIN"
+class PortalRole(IntFlag):
+    ROLE_PORTAL_USER = 1
+    ROLE_PORTAL_ADMIN = 2
+    ROLE_PORTAL_SUPERADMIN = 4
+
+def normalize_email(email: str) -> str:
+    """Emails are stored and looked up lowercased, matching the unique index on lower(email)"""
+    return email.strip().lower()
+
+class RoleMask(TypeDecorator):
+    """Stores a set of PortalRole as an integer bitmask, loads it back as a PortalRole flag"""
+    impl = Integer
+    cache_ok = True
+
+    def process_bind_param(self, value: Union[PortalRole, int, Iterable[PortalRole], None], dialect):
+        if value is None or isinstance(value, int):
+            return value if value is None else int(value)
+        mask = PortalRole(0)
+        for role in value:
+            mask |= role
+        return int(mask)
+
+    def process_result_value(self, value, dialect):
+        if value is not None:
+            return PortalRole(value)
+
 class User(Base): 
     __tablename__ = "users"
 
     user_id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     name = Column(String, nullable=False)
     surname = Column(String, nullable=False)
-    email = Column(String, nullable=False, unique=True)
+    email = Column(String, nullable=False)
     is_active = Column(Boolean, default=True)
     hashed_password = Column(String, nullable=False)
-    roles =  Column(ARRAY(String), nullable=False)
+    roles =  Column(RoleMask, nullable=False)
+    # увеличивается при смене email, ролей и деактивации: старые refresh токены перестают работать
+    token_version = Column(Integer, nullable=False, default=0, server_default="0")
+    # когда пользователь деактивирован; по нему archive-users переносит старые записи в users_archive
+    deactivated_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        # case-insensitive uniqueness, also serves every lookup by email
+        Index("ix_users_email_lower", func.lower(email), unique=True),
+        # keyset pagination over live users only (list_users filters on the bare `is_active` predicate)
+        Index("ix_users_active_user_id", user_id, postgresql_where=text("is_active")),
+        # archival candidates, oldest deactivation first
+        Index("ix_users_deactivated_at", deactivated_at, postgresql_where=text("NOT is_active")),
+        # role filters are written exactly as these predicates (see has_role) so the planner can use them
+        Index("ix_users_admins", user_id, postgresql_where=text("(roles & 2) <> 0")),
+        Index("ix_users_superadmins", user_id, postgresql_where=text("(roles & 4) <> 0")),
+    )
+
+    @classmethod
+    def has_role(cls, roles: PortalRole):
+        """`(roles & <bits>) <> 0` with inlined constants, true if the user has any of `roles`"""
+        return cls.roles.op("&")(literal_column(str(int(roles)))) != literal_column("0")
 
     @property
     def is_admin(self) -> bool: 
-        return PortalRole.ROLE_PORTAL_ADMIN in self.roles
+        return bool(self.roles & PortalRole.ROLE_PORTAL_ADMIN)
     
     @property
     def is_superadmin(self) -> bool: 
-        return PortalRole.ROLE_PORTAL_SUPERADMIN in self.roles 
+        return bool(self.roles & PortalRole.ROLE_PORTAL_SUPERADMIN)
     
     def add_admin_privileges(self): 
         if not self.is_admin: 
-            return {*self.roles, PortalRole.ROLE_PORTAL_ADMIN}
+            return self.roles | PortalRole.ROLE_PORTAL_ADMIN
         
     def revoke_admin_privileges(self): 
         if self.is_admin: 
-            return {role for role in self.roles if role != PortalRole.ROLE_PORTAL_ADMIN}
\ No newline at end of file
+            return self.roles & ~PortalRole.ROLE_PORTAL_ADMIN
+
+
+class UserArchive(Base):
+    """Users deactivated longer than the retention window, moved out of `users` by archive-users.
+
+    Same columns as User plus `archived_at`. Emails are not unique here: once
+    archived, an address can sign up again and may later be archived twice.
+    """
+    __tablename__ = "users_archive"
+
+    user_id = Column(UUID(as_uuid=True), primary_key=True)
+    name = Column(String, nullable=False)
+    surname = Column(String, nullable=False)
+    email = Column(String, nullable=False)
+    is_active = Column(Boolean)
+    hashed_password = Column(String, nullable=False)
+    roles = Column(RoleMask, nullable=False)
+    token_version = Column(Integer, nullable=False)
+    deactivated_at = Column(DateTime(timezone=True), nullable=True)
+    archived_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_users_archive_email_lower", func.lower(email)),
+    )
@@ -0,0 +1,104 @@
+import asyncio
+import json
+from logging import getLogger
+from typing import Callable, NamedTuple, Optional
+from uuid import UUID
+import asyncpg
+from sqlalchemy.engine import make_url
+from src.settings import DATABASE_URL
+
+logger = getLogger(__name__)
+
+# trigger users_notify_changed (migration 059bf5237d70) publishes here
+USER_CHANGED_CHANNEL = "user_changed"
+
+
+class UserChange(NamedTuple):
+    op: str
+    user_id: UUID
+    email: Optional[str]
+
+
+class UserChangeListener:
+    """LISTENs on `user_changed` over a dedicated asyncpg connection.
+
+    Every subscriber gets each UserChange. `on_connection_change()` callbacks
+    are told when the connection comes up (True) and goes down (False):
+    notifications sent while it is down are lost, so per-worker caches must
+    not be trusted in between and have to start over once it is back.
+    """
+    def __init__(self, url: str = DATABASE_URL, reconnect_delay: float = 1.0, max_reconnect_delay: float = 30.0):
+        # asyncpg takes a plain postgresql:// dsn
+        self.dsn = make_url(url).set(drivername="postgresql").render_as_string(hide_password=False)
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self._subscribers: list[Callable[[UserChange], None]] = []
+        self._connection_callbacks: list[Callable[[bool], None]] = []
+        self._task: Optional[asyncio.Task] = None
+        self.connected = asyncio.Event()
+
+    def subscribe(self, callback: Callable[[UserChange], None]) -> None:
+        self._subscribers.append(callback)
+
+    def on_connection_change(self, callback: Callable[[bool], None]) -> None:
+        self._connection_callbacks.append(callback)
+
+    def start(self) -> None:
+        if self._task is None:
+            # an Event stays bound to the loop it was first awaited on, each start gets its own
+            self.connected = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        delay = self.reconnect_delay
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(self.dsn)
+                terminated = asyncio.Event()
+                connection.add_termination_listener(lambda _connection: terminated.set())
+                await connection.add_listener(USER_CHANGED_CHANNEL, self._on_notification)
+                self._set_connected(True)
+                delay = self.reconnect_delay
+                await terminated.wait()
+                logger.warning("user_changed listener connection lost, reconnecting")
+            except asyncio.CancelledError:
+                raise
+            except Exception as err:
+                logger.warning("user_changed listener failed: %s, retrying in %ss", err, delay)
+            finally:
+                self._set_connected(False)
+                if connection is not None and not connection.is_closed():
+                    await connection.close()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    def _set_connected(self, connected: bool) -> None:
+        if connected:
+            self.connected.set()
+        else:
+            self.connected.clear()
+        for callback in self._connection_callbacks:
+            callback(connected)
+
+    def _on_notification(self, _connection, _pid: int, _channel: str, payload: str) -> None:
+        try:
+            data = json.loads(payload)
+            change = UserChange(op=data["op"], user_id=UUID(data["user_id"]), email=data.get("email"))
+        except (ValueError, KeyError, TypeError):
+            logger.warning("Malformed user_changed payload: %r", payload)
+            return
+        for callback in self._subscribers:
+            callback(change)
+
+
+user_change_listener = UserChangeListener()
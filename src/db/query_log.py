@@ -0,0 +1,111 @@
+import json
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from logging import getLogger
+from typing import Iterator, Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = getLogger(__name__)
+slow_query_logger = getLogger("src.db.slow_query")
+
+QUERY_STARTED_AT = "query_started_at"
+
+_LITERALS = (
+    # asyncpg bind parameters, with or without a cast: $1, $2::UUID
+    (re.compile(r"\$\d+(?:::[\w\[\]]+)?"), "?"),
+    (re.compile(r"'(?:''|[^'])*'"), "?"),
+    (re.compile(r"\b\d+(?:\.\d+)?\b"), "?"),
+    (re.compile(r"\bIN \((?:\?, )*\?\)", re.IGNORECASE), "IN (...)"),
+    # multi-row VALUES of bulk inserts
+    (re.compile(r"(VALUES \([^()]*\))(?:, \([^()]*\))+", re.IGNORECASE), r"\1, ..."),
+    (re.compile(r"\s+"), " "),
+)
+
+
+@lru_cache(maxsize=1024)
+def fingerprint(statement: str) -> str:
+    """Statement with literals and bind parameters replaced, so repeats of one query group together"""
+    for pattern, replacement in _LITERALS:
+        statement = pattern.sub(replacement, statement)
+    return statement.strip()
+
+
+class QueryStats:
+    """Statements executed while serving one request"""
+    __slots__ = ("path", "count", "duration", "fingerprints")
+
+    def __init__(self, path: str = ""):
+        self.path = path
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints: Counter[str] = Counter()
+
+    def record(self, statement: str, duration: float) -> None:
+        self.count += 1
+        self.duration += duration
+        self.fingerprints[fingerprint(statement)] += 1
+
+    def repeated(self, min_count: int = 2) -> list[tuple[str, int]]:
+        return [(sql, count) for sql, count in self.fingerprints.most_common() if count >= min_count]
+
+
+_request_queries: ContextVar[Optional[QueryStats]] = ContextVar("request_queries", default=None)
+
+
+@contextmanager
+def track_queries(path: str = "") -> Iterator[QueryStats]:
+    stats = QueryStats(path)
+    token = _request_queries.set(stats)
+    try:
+        yield stats
+    finally:
+        _request_queries.reset(token)
+
+
+def check_query_budget(stats: QueryStats, budget: int, route: str) -> bool:
+    """Logs requests that ran more statements than `budget`, usually an N+1 loop"""
+    if budget <= 0 or stats.count <= budget:
+        return True
+    logger.warning(json.dumps({
+        "event": "query_budget_exceeded",
+        "route": route,
+        "statements": stats.count,
+        "budget": budget,
+        "db_ms": round(stats.duration * 1000, 2),
+        "repeated": [{"fingerprint": sql, "count": count} for sql, count in stats.repeated()[:5]],
+    }))
+    return False
+
+
+def install_query_listeners(target: Engine, slow_query_ms: float) -> None:
+    """Times every statement on `target` (a sync Engine, e.g. AsyncEngine.sync_engine)"""
+
+    @event.listens_for(target, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault(QUERY_STARTED_AT, []).append(time.perf_counter())
+
+    @event.listens_for(target, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        duration = time.perf_counter() - conn.info[QUERY_STARTED_AT].pop()
+        stats = _request_queries.get()
+        if stats is not None:
+            stats.record(statement, duration)
+        if slow_query_ms > 0 and duration * 1000 >= slow_query_ms:
+            slow_query_logger.warning(json.dumps({
+                "event": "slow_query",
+                "duration_ms": round(duration * 1000, 2),
+                "fingerprint": fingerprint(statement),
+                "executemany": executemany,
+                "path": stats.path if stats is not None else None,
+            }))
+
+    @event.listens_for(target, "handle_error")
+    def _handle_error(exception_context):
+        started = exception_context.connection.info.get(QUERY_STARTED_AT) if exception_context.connection else None
+        if started:
+            started.pop()
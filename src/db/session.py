@@ -1,17 +1,189 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker
+import time
+from contextlib import asynccontextmanager
+from typing import Callable, Hashable, Optional
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, AsyncSession
+from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from starlette.requests import Request
 
 from src.settings import DATABASE_URL
+from src.metrics import timed
+from src.db.query_log import install_query_listeners
+from src.config import (
+    DB_ECHO, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_POOL_PRE_PING,
+    DB_STATEMENT_CACHE_SIZE, DB_SLOW_QUERY_MS,
+    DATABASE_READ_URL, DB_READ_POOL_SIZE, DB_REPLICA_LAG_SECONDS,
+)
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long each checkout waited for a connection"""
+    def __init__(self, *args, max_overflow: int = 10, **kwargs):
+        super().__init__(*args, max_overflow=max_overflow, **kwargs)
+        self.max_overflow = max_overflow
+        self.checkouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            waited = time.perf_counter() - started
+            self.checkouts += 1
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+
+def build_engine(url: str = DATABASE_URL, **overrides) -> AsyncEngine:
+    options = dict(
+        echo=DB_ECHO,
+        poolclass=TimedQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+        connect_args={"prepared_statement_cache_size": DB_STATEMENT_CACHE_SIZE},
+    )
+    options.update(overrides)
+    new_engine = create_async_engine(url, **options)
+    install_query_listeners(new_engine.sync_engine, slow_query_ms=DB_SLOW_QUERY_MS)
+    return new_engine
+
+
+def pool_status(target: AsyncEngine = None) -> dict:
+    pool = (target or engine).pool
+    status = {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "idle": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+    }
+    if isinstance(pool, TimedQueuePool):
+        status.update(
+            max_overflow=pool.max_overflow,
+            checkouts=pool.checkouts,
+            wait_seconds_total=pool.wait_seconds_total,
+            wait_seconds_max=pool.wait_seconds_max,
+        )
+    return status
+
 
 # Движок для создания фабрики сессий
-engine = create_async_engine(DATABASE_URL, future=True, echo=True)
+engine = build_engine()
 
-# Фабрика сессий с бд 
+# Фабрика сессий с бд
 async_session =  sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
 
-async def get_db(): 
+# Движок реплики только для чтения, без реплики чтение идет в основную бд
+if DATABASE_READ_URL:
+    read_engine = build_engine(
+        DATABASE_READ_URL,
+        pool_size=DB_READ_POOL_SIZE,
+        execution_options={"postgresql_readonly": True},
+    )
+else:
+    read_engine = engine
+
+async_read_session = sessionmaker(read_engine, expire_on_commit=False, class_=AsyncSession)
+
+AFTER_COMMIT_HOOKS = "after_commit_hooks"
+
+
+def on_commit(session: AsyncSession, callback: Callable[[], None]) -> None:
+    """Run `callback` once the session's current transaction is committed"""
+    session.info.setdefault(AFTER_COMMIT_HOOKS, []).append(callback)
+
+
+@event.listens_for(Session, "after_commit")
+def _run_after_commit_hooks(session: Session) -> None:
+    for callback in session.info.pop(AFTER_COMMIT_HOOKS, ()):
+        callback()
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_after_commit_hooks(session: Session) -> None:
+    session.info.pop(AFTER_COMMIT_HOOKS, None)
+
+
+@asynccontextmanager
+async def unit_of_work(session: AsyncSession):
+    """One transaction per request.
+
+    Nothing is sent to the database until the first statement (the session
+    autobegins), every dependency and helper of the request shares that
+    transaction, and it is committed once after the handler returns or
+    rolled back if it raises.
+    """
     try:
-        session: AsyncSession = async_session()
         yield session
-    finally: 
-        await session.close()
\ No newline at end of file
+        if session.in_transaction():
+            with timed("db"):
+                await session.commit()
+    except Exception:
+        await session.rollback()
+        raise
+    finally:
+        await session.close()
+
+
+class RecentWrites:
+    """Keys (a client's credentials, a written user_id) that wrote within the last `window` seconds.
+
+    Reads for such keys go to the primary until the replica has had time to
+    catch up. Per process: a client served by another worker right after a
+    write may still read from the replica within the lag tolerance.
+    """
+    def __init__(self, window: float):
+        self.window = window
+        self._expires_at: dict[Hashable, float] = {}
+
+    def mark(self, *keys: Optional[Hashable]) -> None:
+        if self.window <= 0:
+            return
+        now = time.monotonic()
+        # the window is fixed, so insertion order is expiry order: expired keys are always at the front
+        while self._expires_at:
+            oldest = next(iter(self._expires_at))
+            if self._expires_at[oldest] > now:
+                break
+            del self._expires_at[oldest]
+        for key in keys:
+            if key is not None:
+                # re-inserted at the end, keeps the order
+                self._expires_at.pop(key, None)
+                self._expires_at[key] = now + self.window
+
+    def recent(self, *keys: Optional[Hashable]) -> bool:
+        now = time.monotonic()
+        return any(key is not None and self._expires_at.get(key, 0.0) > now for key in keys)
+
+
+recent_writes = RecentWrites(window=DB_REPLICA_LAG_SECONDS if read_engine is not engine else 0)
+
+
+def _request_write_keys(request: Request) -> tuple[Optional[str], Optional[str]]:
+    return request.headers.get("authorization"), request.query_params.get("user_id")
+
+
+async def get_db(request: Request):
+    async with unit_of_work(async_session()) as session:
+        yield session
+    if request.method != "GET":
+        recent_writes.mark(*_request_write_keys(request))
+
+
+async def _get_replica_db(request: Request):
+    if recent_writes.recent(*_request_write_keys(request)):
+        session = async_session()
+    else:
+        session = async_read_session()
+    async with unit_of_work(session) as session:
+        yield session
+
+
+# Без реплики чтение делит с запросом ту же сессию (FastAPI кэширует зависимость по функции)
+get_read_db = _get_replica_db if read_engine is not engine else get_db
@@ -1,13 +1,97 @@
+import asyncio
+from contextlib import asynccontextmanager
+from logging import getLogger
 from fastapi import FastAPI 
+from fastapi.responses import ORJSONResponse
 import uvicorn
 from fastapi.routing import APIRouter
 
 from src.api.main_handlers import user_router
 from src.api.main_handlers import login_router
+from src.api.main_handlers import service_router
+from src.api.main_handlers import metrics_router
+from src.api.handlers.auth.hasher import hashing_service, calibrate_bcrypt_rounds
+from src.api.handlers.auth.email_filter import email_filter
+from src.api.handlers.auth.cache import user_cache
+from src.db.notifications import UserChange, user_change_listener
+from src.db.session import engine, read_engine
+from src.db.archive import archive_periodically
+from src.config import BCRYPT_CALIBRATE_ON_STARTUP, BCRYPT_ROUNDS, BCRYPT_TARGET_MS
+from src.config import METRICS_ENABLED, SERVER_TIMING_ENABLED, DB_QUERY_BUDGET
+from src.config import USER_CHANGE_LISTENER_ENABLED, USER_CHANGE_LISTENER_STARTUP_TIMEOUT, DB_REPLICA_LAG_SECONDS
+from src.config import USER_ARCHIVE_ENABLED, EMAIL_FILTER_REFRESH_SECONDS
+from src.metrics import TimingMiddleware
+from src.warmup import warm_up_until_ready
+
+logger = getLogger(__name__)
+
+
+def _on_user_changed(change: UserChange) -> None:
+    user_cache.invalidate_user(change.user_id)
+    if read_engine is not engine:
+        # a lookup right after the eviction may still read the old row from the replica
+        asyncio.get_running_loop().call_later(DB_REPLICA_LAG_SECONDS, user_cache.invalidate_user, change.user_id)
+    if change.op != "DELETE" and change.email:
+        email_filter.add(change.email)
+
+
+async def _start_user_change_listener() -> None:
+    user_change_listener.subscribe(_on_user_changed)
+    user_change_listener.on_connection_change(lambda connected: user_cache.set_paused(not connected))
+    user_change_listener.on_connection_change(lambda connected: email_filter.set_paused(not connected))
+    # no cached reads and no "unknown email" answers until other workers' changes can reach us
+    user_cache.set_paused(True)
+    email_filter.set_paused(True)
+    user_change_listener.start()
+    try:
+        await asyncio.wait_for(user_change_listener.connected.wait(), USER_CHANGE_LISTENER_STARTUP_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.warning("user_changed listener is not connected yet, the auth cache stays off until it is")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Подбор стоимости bcrypt под железо, если она не задана явно через BCRYPT_ROUNDS
+    if BCRYPT_CALIBRATE_ON_STARTUP and BCRYPT_ROUNDS is None:
+        rounds = await asyncio.to_thread(calibrate_bcrypt_rounds, BCRYPT_TARGET_MS)
+        hashing_service.set_bcrypt_rounds(rounds)
+        logger.info("bcrypt cost calibrated to %s rounds for a %s ms budget", rounds, BCRYPT_TARGET_MS)
+    app.state.ready = False
+    if USER_CHANGE_LISTENER_ENABLED:
+        await _start_user_change_listener()
+    elif email_filter.enabled:
+        # signups on other workers would never reach the filter and their logins would be rejected
+        logger.warning("EMAIL_FILTER_ENABLED needs the user_changed listener, the email filter stays off")
+        email_filter.set_paused(True)
+    background_tasks = []
+    if email_filter.enabled and USER_CHANGE_LISTENER_ENABLED:
+        await email_filter.rebuild()
+        if EMAIL_FILTER_REFRESH_SECONDS > 0:
+            background_tasks.append(asyncio.create_task(email_filter.refresh_periodically()))
+    if USER_ARCHIVE_ENABLED:
+        # every worker runs it, SKIP LOCKED keeps them off each other's batches
+        background_tasks.append(asyncio.create_task(archive_periodically()))
+    # requests are served right away, /service/ready turns 200 once warm
+    background_tasks.append(asyncio.create_task(warm_up_until_ready(app.state)))
+    yield
+    # uvicorn has stopped accepting and drained in-flight requests by now
+    app.state.ready = False
+    for task in background_tasks:
+        task.cancel()
+    await user_change_listener.stop()
+    hashing_service.shutdown()
+    await engine.dispose()
+    if read_engine is not engine:
+        await read_engine.dispose()
+
 
 app = FastAPI(
-    title = "Some Landing"
+    title = "Some Landing",
+    lifespan = lifespan,
+    default_response_class = ORJSONResponse,
 )
+if METRICS_ENABLED:
+    app.add_middleware(TimingMiddleware, server_timing=SERVER_TIMING_ENABLED, query_budget=DB_QUERY_BUDGET)
 
 
 # Создание инстанса для всех роутев (роутер, который собирает в себя остальные роутеры)
@@ -24,6 +108,15 @@ main_api_router.include_router(
     prefix="/login", 
     tags=["login"]
 )
+main_api_router.include_router(
+    service_router, 
+    prefix="/service", 
+    tags=["service"]
+)
+main_api_router.include_router(
+    metrics_router, 
+    tags=["service"]
+)
 # Включение главного роутера в app
 app.include_router(main_api_router)
 
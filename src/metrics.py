@@ -0,0 +1,196 @@
+import inspect
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Iterator, Optional
+from src.db.query_log import QueryStats, check_query_budget, track_queries
+
+# Фазы текущего запроса: имя фазы -> суммарное время в секундах
+_request_phases: ContextVar[Optional[dict[str, float]]] = ContextVar("request_phases", default=None)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+
+
+@contextmanager
+def timed(phase: str) -> Iterator[None]:
+    """Adds the wall time of the block to `phase` of the current request, a no-op outside of one"""
+    phases = _request_phases.get()
+    if phases is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        phases[phase] = phases.get(phase, 0.0) + time.perf_counter() - started
+
+
+def timed_methods(phase: str):
+    """Class decorator: every public coroutine method is recorded under `phase`"""
+    def decorate(cls):
+        for name, member in list(vars(cls).items()):
+            if name.startswith("_") or not inspect.iscoroutinefunction(member):
+                continue
+            setattr(cls, name, _timed_coroutine(phase, member))
+        return cls
+    return decorate
+
+
+def _timed_coroutine(phase: str, func):
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        with timed(phase):
+            return await func(*args, **kwargs)
+    return wrapper
+
+
+class Histogram:
+    """Cumulative Prometheus histogram, one series per label tuple"""
+    def __init__(self, name: str, description: str, label_names: tuple[str, ...], buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self.buckets = tuple(buckets)
+        self._series: dict[tuple[str, ...], list] = {}
+
+    def observe(self, labels: tuple[str, ...], value: float) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            # [counts per bucket (last one is +Inf), sum]
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.description}"
+        yield f"# TYPE {self.name} histogram"
+        for labels, (counts, total) in sorted(self._series.items()):
+            label_text = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"), ), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                yield f'{self.name}_bucket{{{label_text},le="{le}"}} {cumulative}'
+            yield f"{self.name}_sum{{{label_text}}} {total}"
+            yield f"{self.name}_count{{{label_text}}} {cumulative}"
+
+    def clear(self) -> None:
+        self._series.clear()
+
+
+class Counter:
+    """Monotonic Prometheus counter, one series per label tuple"""
+    def __init__(self, name: str, description: str, label_names: tuple[str, ...]):
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self._series: dict[tuple[str, ...], int] = {}
+
+    def inc(self, labels: tuple[str, ...], amount: int = 1) -> None:
+        self._series[labels] = self._series.get(labels, 0) + amount
+
+    def value(self, labels: tuple[str, ...]) -> int:
+        return self._series.get(labels, 0)
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.description}"
+        yield f"# TYPE {self.name} counter"
+        for labels, count in sorted(self._series.items()):
+            label_text = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, labels))
+            yield f"{self.name}{{{label_text}}} {count}"
+
+    def clear(self) -> None:
+        self._series.clear()
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+request_duration = Histogram(
+    "http_request_duration_seconds", "Time to serve a request, by route", ("method", "route", "status"),
+)
+phase_duration = Histogram(
+    "http_request_phase_seconds", "Time spent per request in db, bcrypt and jwt, by route",
+    ("method", "route", "phase"),
+)
+request_statements = Histogram(
+    "http_request_sql_statements", "SQL statements executed per request, by route", ("method", "route"),
+    buckets=STATEMENT_BUCKETS,
+)
+# outcome: "executed" ran its own query, "coalesced" shared one already in flight (a query saved)
+coalesced_reads = Counter(
+    "db_coalesced_reads_total", "UserDAL lookups by whether they ran a query or joined one in flight",
+    ("method", "outcome"),
+)
+
+
+def render_metrics() -> str:
+    lines = [
+        *request_duration.render(), *phase_duration.render(), *request_statements.render(),
+        *coalesced_reads.render(),
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def _route_label(scope) -> str:
+    route = scope.get("route")
+    # unmatched paths share one series so random URLs do not blow up the label set
+    return getattr(route, "path", "unmatched")
+
+
+class TimingMiddleware:
+    """Pure ASGI middleware recording per-request phase timings.
+
+    Phases reported by `timed` show up in a `Server-Timing` header together
+    with `app` (time to the first response byte), `other` (the rest:
+    validation, serialization and framework overhead) and `sql` (driver time
+    and statement count seen by the engine listeners), and every request is
+    observed in the per-route histograms rendered by `render_metrics`.
+    Requests running more than `query_budget` statements are logged.
+    """
+    def __init__(self, app, server_timing: bool = True, query_budget: int = 0):
+        self.app = app
+        self.server_timing = server_timing
+        self.query_budget = query_budget
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        phases: dict[str, float] = {}
+        token = _request_phases.set(phases)
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if self.server_timing:
+                    header = _server_timing_header(phases, queries, time.perf_counter() - started)
+                    message = {**message, "headers": [*message.get("headers", []), (b"server-timing", header)]}
+            await send(message)
+
+        with track_queries(scope["path"]) as queries:
+            try:
+                await self.app(scope, receive, send_with_timing)
+            finally:
+                _request_phases.reset(token)
+                method, route = scope["method"], _route_label(scope)
+                request_duration.observe((method, route, str(status_code)), time.perf_counter() - started)
+                for phase, duration in phases.items():
+                    phase_duration.observe((method, route, phase), duration)
+                request_statements.observe((method, route), queries.count)
+                check_query_budget(queries, self.query_budget, f"{method} {route}")
+
+
+def _server_timing_header(phases: dict[str, float], queries: QueryStats, elapsed: float) -> bytes:
+    entries = [f"{phase};dur={duration * 1000:.2f}" for phase, duration in phases.items()]
+    entries.append(f'sql;dur={queries.duration * 1000:.2f};desc="{queries.count} statements"')
+    other = max(elapsed - sum(phases.values()), 0.0)
+    entries.append(f"other;dur={other * 1000:.2f}")
+    entries.append(f"app;dur={elapsed * 1000:.2f}")
+    return ", ".join(entries).encode()
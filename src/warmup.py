@@ -0,0 +1,58 @@
+import asyncio
+import uuid
+from logging import getLogger
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from src.api.handlers.auth.auth import _verify_dummy_password
+from src.api.handlers.auth.hasher import Hasher, hashing_service
+from src.config import DB_POOL_SIZE, DB_READ_POOL_SIZE
+from src.db.dals import UserDAL
+from src.db.session import engine, read_engine
+
+logger = getLogger(__name__)
+
+
+async def _warm_engine(target: AsyncEngine, connections: int) -> None:
+    """Opens `connections` pool connections at once and runs the hot lookups on each.
+
+    asyncpg prepares statements per connection, so every pooled connection
+    gets its own copy of the by-id and by-email lookups.
+    """
+    async def warm_connection():
+        async with target.connect() as connection:
+            session = AsyncSession(bind=connection)
+            user_dal = UserDAL(session)
+            await user_dal.get_user_by_id(uuid.UUID(int=0))
+            await user_dal.get_user_by_email("warmup@invalid")
+            await session.close()
+
+    await asyncio.gather(*(warm_connection() for _ in range(connections)))
+
+
+async def _warm_hasher() -> None:
+    # process workers are spawned one by one on demand, keep all of them busy once
+    await Hasher.get_password_hashes_async(["warmup"] * hashing_service.max_workers)
+    # also builds the dummy hash unknown-email logins are checked against
+    await _verify_dummy_password("warmup")
+
+
+async def warm_up() -> None:
+    warmups = [_warm_engine(engine, DB_POOL_SIZE), _warm_hasher()]
+    if read_engine is not engine:
+        warmups.append(_warm_engine(read_engine, DB_READ_POOL_SIZE))
+    await asyncio.gather(*warmups)
+
+
+async def warm_up_until_ready(state, retry_delay: float = 2.0, max_retry_delay: float = 30.0) -> None:
+    """Sets `state.ready` once warm_up succeeds, retrying while the database is unreachable"""
+    delay = retry_delay
+    while True:
+        try:
+            await warm_up()
+        except Exception as err:
+            logger.warning("Warm-up failed: %s, retrying in %ss", err, delay)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, max_retry_delay)
+        else:
+            state.ready = True
+            logger.info("Warm-up finished, ready to serve")
+            return
@@ -1,46 +1,42 @@
 from typing import Generator, Any
 import pytest
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 from starlette.testclient import TestClient
 from src.settings import TEST_DATABASE_URL
 from src.main import app
 import os
 import asyncio
-from src.db.session import get_db
+from src.db.session import get_db, get_read_db, unit_of_work
 import asyncpg
 
 
 # create async engine for interaction with database
-test_engine = create_async_engine(TEST_DATABASE_URL, future=True, echo=True)
+# NullPool: every TestClient runs the app on its own event loop, pooled asyncpg connections are tied to one
+test_engine = create_async_engine(TEST_DATABASE_URL, future=True, echo=True, poolclass=NullPool)
 
 # create session for the interaction with database
 test_async_session = sessionmaker(test_engine, expire_on_commit=False, class_=AsyncSession)
 
 CLEAN_TABLES = [
     "users",
+    "users_archive",
 ]
 
 
-@pytest.fixture(scope="session")
-def event_loop():
-    loop = asyncio.get_event_loop_policy().new_event_loop()
-    yield loop
-    loop.close()
-
-
 @pytest.fixture(scope="session", autouse=True)
-async def run_migrations():
-    os.system("alembic init migrations")
-    os.system('alembic revision --autogenerate -m "test running migrations"')
-    os.system("alembic upgrade heads")
+def run_migrations():
+    os.system("alembic upgrade head")
 
 
-@pytest.fixture(scope="session")
+@pytest.fixture
 async def async_session_test():
     engine = create_async_engine(TEST_DATABASE_URL, future=True, echo=True)
     async_session = sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
     yield async_session
+    await engine.dispose()
 
 
 @pytest.fixture(scope="function", autouse=True)
@@ -49,14 +45,12 @@ async def clean_tables(async_session_test):
     async with async_session_test() as session:
         async with session.begin():
             for table_for_cleaning in CLEAN_TABLES:
-                await session.execute(f"""TRUNCATE TABLE {table_for_cleaning};""")
+                await session.execute(text(f"""TRUNCATE TABLE {table_for_cleaning};"""))
 
 
 async def _get_test_db():
-    try:
-        yield test_async_session()
-    finally:
-        pass
+    async with unit_of_work(test_async_session()) as session:
+        yield session
 
 @pytest.fixture(scope="function")
 async def client():
@@ -66,15 +60,16 @@ async def client():
     """
 
     app.dependency_overrides[get_db] = _get_test_db
+    app.dependency_overrides[get_read_db] = _get_test_db
     with TestClient(app) as client:
         yield client
 
 
-@pytest.fixture(scope="session")
+@pytest.fixture
 async def asyncpg_pool():
     pool = await asyncpg.create_pool("".join(TEST_DATABASE_URL.split("+asyncpg")))
     yield pool
-    pool.close()
+    await pool.close()
 
 
 @pytest.fixture
@@ -0,0 +1,73 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from src.db.dals import UserDAL, _update_values
+from src.db.models import PortalRole
+
+
+def test_deactivation_is_stamped_with_the_token_version_bump():
+    values = _update_values({"is_active": False})
+    assert set(values) == {"is_active", "deactivated_at", "token_version"}
+    assert _update_values({"is_active": True})["deactivated_at"] is None
+    assert _update_values({"name": "Ivan"}) == {"name": "Ivan"}
+
+
+async def _insert_user(asyncpg_pool, email, is_active=True, deactivated_at=None):
+    user_id = uuid.uuid4()
+    async with asyncpg_pool.acquire() as connection:
+        await connection.execute(
+            """INSERT INTO users (user_id, name, surname, email, is_active, hashed_password, roles, token_version, deactivated_at)
+            VALUES ($1, 'Ivan', 'Ivanov', $2, $3, 'hash', $4, 3, $5);""",
+            user_id, email, is_active, int(PortalRole.ROLE_PORTAL_USER), deactivated_at,
+        )
+    return user_id
+
+
+async def _user_ids(asyncpg_pool, table):
+    async with asyncpg_pool.acquire() as connection:
+        return {row["user_id"] for row in await connection.fetch(f"""SELECT user_id FROM {table};""")}
+
+
+async def test_archival_moves_only_old_deactivated_users(async_session_test, asyncpg_pool):
+    now = datetime.now(timezone.utc)
+    old = await _insert_user(asyncpg_pool, "old@kek.com", is_active=False, deactivated_at=now - timedelta(days=40))
+    recent = await _insert_user(asyncpg_pool, "recent@kek.com", is_active=False, deactivated_at=now - timedelta(days=1))
+    active = await _insert_user(asyncpg_pool, "active@kek.com")
+
+    async with async_session_test() as session:
+        async with session.begin():
+            moved = await UserDAL(session).archive_deactivated_users(now - timedelta(days=30), 10)
+
+    assert moved == 1
+    assert await _user_ids(asyncpg_pool, "users") == {recent, active}
+    async with asyncpg_pool.acquire() as connection:
+        archived = await connection.fetchrow("""SELECT * FROM users_archive WHERE user_id = $1;""", old)
+    assert archived["name"] == "Ivan"
+    assert archived["surname"] == "Ivanov"
+    assert archived["email"] == "old@kek.com"
+    assert archived["is_active"] is False
+    assert archived["hashed_password"] == "hash"
+    assert archived["roles"] == int(PortalRole.ROLE_PORTAL_USER)
+    assert archived["token_version"] == 3
+    assert archived["deactivated_at"] == now - timedelta(days=40)
+    assert archived["archived_at"] is not None
+
+
+async def test_concurrent_archival_moves_each_user_once(async_session_test, asyncpg_pool):
+    now = datetime.now(timezone.utc)
+    expired = {
+        await _insert_user(asyncpg_pool, f"old{i}@kek.com", is_active=False, deactivated_at=now - timedelta(days=40 + i))
+        for i in range(4)
+    }
+
+    async with async_session_test() as first, async_session_test() as second:
+        async with first.begin(), second.begin():
+            # the first run holds its rows until commit, the second one overlaps with it
+            moved_first = await UserDAL(first).archive_deactivated_users(now - timedelta(days=30), 10)
+            moved_second = await UserDAL(second).archive_deactivated_users(now - timedelta(days=30), 10)
+
+    assert (moved_first, moved_second) == (4, 0)
+    assert await _user_ids(asyncpg_pool, "users") == set()
+    assert await _user_ids(asyncpg_pool, "users_archive") == expired
+    async with asyncpg_pool.acquire() as connection:
+        assert await connection.fetchval("""SELECT count(*) FROM users_archive;""") == 4
@@ -0,0 +1,83 @@
+import time
+import uuid
+from src.api.handlers.auth.cache import AuthenticatedUserCache, UserSnapshot
+from src.db.models import PortalRole
+
+
+def _snapshot(**kwargs) -> UserSnapshot:
+    fields = {
+        "user_id": uuid.uuid4(),
+        "name": "Nikolai",
+        "surname": "Sviridov",
+        "email": "lol@kek.com",
+        "is_active": True,
+        "roles": PortalRole.ROLE_PORTAL_USER,
+    }
+    fields.update(kwargs)
+    return UserSnapshot(**fields)
+
+
+def test_cache_evicts_least_recently_used():
+    cache = AuthenticatedUserCache(maxsize=2, ttl=60)
+    cache.set("first", _snapshot())
+    cache.set("second", _snapshot())
+    assert cache.get("first") is not None
+    cache.set("third", _snapshot())
+    assert cache.get("second") is None
+    assert cache.get("first") is not None
+    assert len(cache) == 2
+
+
+def test_cache_invalidate_user_drops_all_tokens():
+    cache = AuthenticatedUserCache(maxsize=10, ttl=60)
+    user = _snapshot()
+    other_user = _snapshot()
+    cache.set("token_1", user)
+    cache.set("token_2", user)
+    cache.set("token_3", other_user)
+    cache.invalidate_user(user.user_id)
+    assert cache.get("token_1") is None
+    assert cache.get("token_2") is None
+    assert cache.get("token_3") == other_user
+
+
+def test_cache_does_not_outlive_token():
+    cache = AuthenticatedUserCache(maxsize=10, ttl=60)
+    cache.set("expired", _snapshot(), token_exp=time.time() - 1)
+    assert cache.get("expired") is None
+
+
+def test_paused_cache_is_cleared_and_serves_nothing():
+    cache = AuthenticatedUserCache(maxsize=10, ttl=60)
+    cache.set("token", _snapshot())
+    cache.set_paused(True)
+    assert cache.get("token") is None
+    cache.set("token", _snapshot())
+    assert len(cache) == 0
+    cache.set_paused(False)
+    cache.set("token", _snapshot())
+    assert cache.get("token") is not None
+
+
+def test_cache_drops_snapshot_read_before_an_invalidation():
+    cache = AuthenticatedUserCache(maxsize=10, ttl=60)
+    user = _snapshot()
+    other_user = _snapshot()
+    generation = cache.generation
+    # the user changes while the lookup is reading the row
+    cache.invalidate_user(user.user_id)
+    cache.set("token", user, generation=generation)
+    assert cache.get("token") is None
+    cache.set("other_token", other_user, generation=generation)
+    assert cache.get("other_token") == other_user
+    # a lookup started after the invalidation is stored
+    cache.set("token", user, generation=cache.generation)
+    assert cache.get("token") == user
+
+
+def test_cache_drops_snapshots_read_before_a_clear():
+    cache = AuthenticatedUserCache(maxsize=10, ttl=60)
+    generation = cache.generation
+    cache.clear()
+    cache.set("token", _snapshot(), generation=generation)
+    assert cache.get("token") is None
@@ -0,0 +1,83 @@
+import asyncio
+
+import pytest
+
+from src.db.coalesce import SingleFlight
+from src.metrics import Counter
+
+
+def test_concurrent_calls_share_one_execution():
+    async def scenario():
+        flight = SingleFlight()
+        calls = 0
+
+        async def load():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return "user"
+
+        results = await asyncio.gather(*(flight.do("key", load) for _ in range(5)))
+        assert calls == 1
+        assert [shared for _, shared in results].count(False) == 1
+        assert {result for result, _ in results} == {"user"}
+        assert len(flight) == 0
+        # finished calls are not reused
+        assert await flight.do("key", load) == ("user", False)
+        assert calls == 2
+
+    asyncio.run(scenario())
+
+
+def test_failed_leader_is_not_shared():
+    async def scenario():
+        flight = SingleFlight()
+        attempts = 0
+
+        async def load():
+            nonlocal attempts
+            attempts += 1
+            await asyncio.sleep(0.01)
+            if attempts == 1:
+                raise ConnectionError("leader connection lost")
+            return "user"
+
+        leader = asyncio.create_task(flight.do("key", load))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.do("key", load))
+        with pytest.raises(ConnectionError):
+            await leader
+        assert await follower == ("user", False)
+        assert attempts == 2
+
+    asyncio.run(scenario())
+
+
+def test_counter_renders_prometheus_text():
+    counter = Counter("db_coalesced_reads_total", "lookups", ("method", "outcome"))
+    counter.inc(("get_user_by_email", "coalesced"), 3)
+    counter.inc(("get_user_by_email", "coalesced"))
+    assert counter.value(("get_user_by_email", "coalesced")) == 4
+    assert list(counter.render())[-1] == 'db_coalesced_reads_total{method="get_user_by_email",outcome="coalesced"} 4'
+
+
+def test_forget_starts_new_executions():
+    async def scenario():
+        flight = SingleFlight()
+        calls = 0
+
+        async def load():
+            nonlocal calls
+            calls += 1
+            call = calls
+            await asyncio.sleep(0.01)
+            return call
+
+        leader = asyncio.create_task(flight.do("key", load))
+        await asyncio.sleep(0)
+        flight.forget()
+        assert await flight.do("key", load) == (2, False)
+        assert await leader == (1, False)
+        assert len(flight) == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,80 @@
+import asyncio
+
+from src.api.handlers.auth import email_filter as email_filter_module
+from src.api.handlers.auth.email_filter import BloomFilter, EmailFilter
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    emails = [f"user{i}@kek.com" for i in range(1000)]
+    for email in emails:
+        bloom.add(email)
+    assert all(email in bloom for email in emails)
+    false_positives = sum(f"other{i}@kek.com" in bloom for i in range(10000))
+    assert false_positives < 300
+
+
+def test_email_filter_is_permissive_until_built():
+    email_filter = EmailFilter(enabled=True, error_rate=0.01, min_capacity=100)
+    assert email_filter.might_exist("lol@kek.com")
+    email_filter._filter = BloomFilter(capacity=100, error_rate=0.01)
+    assert not email_filter.might_exist("lol@kek.com")
+    email_filter.add(" LOL@kek.com")
+    assert email_filter.might_exist("lol@kek.com")
+
+
+def test_email_filter_is_permissive_while_paused():
+    email_filter = EmailFilter(enabled=True, error_rate=0.01, min_capacity=100)
+    email_filter._filter = BloomFilter(capacity=100, error_rate=0.01)
+    email_filter.set_paused(True)
+    assert email_filter.might_exist("lol@kek.com")
+    # changes sent while the listener was down are lost, only a rebuild lifts the pause
+    email_filter._filter = None
+    email_filter.set_paused(False)
+    assert email_filter.paused
+
+
+class _SlowUserDAL:
+    """Streams a fixed set of emails, slowly enough for rebuilds to overlap"""
+    emails = ["first@kek.com", "second@kek.com"]
+
+    def __init__(self, _session):
+        pass
+
+    async def count_users(self):
+        return len(self.emails)
+
+    async def stream_emails(self):
+        for email in self.emails:
+            await asyncio.sleep(0.01)
+            yield [email]
+
+
+class _NoSession:
+    async def __aenter__(self):
+        return None
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+
+def test_overlapping_rebuilds_run_one_after_another(monkeypatch):
+    monkeypatch.setattr(email_filter_module, "UserDAL", _SlowUserDAL)
+    monkeypatch.setattr(email_filter_module, "async_session", _NoSession)
+
+    async def scenario():
+        email_filter = EmailFilter(enabled=True, error_rate=0.01, min_capacity=100)
+        email_filter.set_paused(True)
+        periodic = asyncio.create_task(email_filter.rebuild())
+        await asyncio.sleep(0.005)
+        # the listener reconnects while the rebuild is running
+        email_filter.set_paused(False)
+        await periodic
+        # the running rebuild started before the reconnect and must not lift the pause
+        assert email_filter.paused
+        await asyncio.gather(*email_filter._rebuild_tasks)
+        assert not email_filter.paused
+        assert all(email_filter.might_exist(email) for email in _SlowUserDAL.emails)
+        assert not email_filter.might_exist("other@kek.com")
+
+    asyncio.run(scenario())
@@ -1,11 +1,18 @@
 import json
+import uuid
+
+import pytest
+from fastapi import HTTPException
+
+from src.api.handlers.users import user as user_handlers
 
 
 async def test_create_user(client, get_user_from_database):
     user_data = {
       "name": "Nikolai",
       "surname": "Sviridov",
-      "email": "lol@kek.com"
+      "email": "lol@kek.com",
+      "password": "password"
     }
     resp = client.post("/user/", data=json.dumps(user_data))
     data_from_resp = resp.json()
@@ -21,4 +28,75 @@ async def test_create_user(client, get_user_from_database):
     assert user_from_db["surname"] == user_data["surname"]
     assert user_from_db["email"] == user_data["email"]
     assert user_from_db["is_active"] is True
-    assert str(user_from_db["user_id"]) == data_from_resp["user_id"]
\ No newline at end of file
+    assert str(user_from_db["user_id"]) == data_from_resp["user_id"]
+
+async def test_create_user_normalizes_email(client, get_user_from_database):
+    user_data = {
+      "name": "Nikolai",
+      "surname": "Sviridov",
+      "email": "Lol@Kek.COM",
+      "password": "password"
+    }
+    resp = client.post("/user/", data=json.dumps(user_data))
+    data_from_resp = resp.json()
+    assert resp.status_code == 200
+    assert data_from_resp["email"] == "lol@kek.com"
+    users_from_db = await get_user_from_database(data_from_resp["user_id"])
+    assert dict(users_from_db[0])["email"] == "lol@kek.com"
+
+
+def _create_user(client, email):
+    user_data = {"name": "Nikolai", "surname": "Sviridov", "email": email, "password": "password"}
+    resp = client.post("/user/", data=json.dumps(user_data))
+    assert resp.status_code == 200
+    return resp.json()["user_id"]
+
+
+def _auth_headers(client, email):
+    resp = client.post("/login/token", data={"username": email, "password": "password"})
+    assert resp.status_code == 200
+    return {"Authorization": f"Bearer {resp.json()['access_token']}"}
+
+
+async def test_get_users_batch_keeps_request_order_and_lists_missing(client):
+    first = _create_user(client, "first@kek.com")
+    second = _create_user(client, "second@kek.com")
+    unknown = str(uuid.uuid4())
+    resp = client.get(
+        "/user/batch",
+        params=[("ids", second), ("ids", unknown), ("ids", first), ("ids", second)],
+        headers=_auth_headers(client, "first@kek.com"),
+    )
+    assert resp.status_code == 200
+    data_from_resp = resp.json()
+    # duplicates collapse to their first occurrence
+    assert [user["user_id"] for user in data_from_resp["users"]] == [second, first]
+    assert [user["email"] for user in data_from_resp["users"]] == ["second@kek.com", "first@kek.com"]
+    assert data_from_resp["missing"] == [unknown]
+
+
+async def test_get_users_batch_rejects_too_many_ids(client, monkeypatch):
+    _create_user(client, "first@kek.com")
+    monkeypatch.setattr(user_handlers, "USER_BATCH_MAX_SIZE", 2)
+    ids = [("ids", str(uuid.uuid4())) for _ in range(3)]
+    resp = client.get("/user/batch", params=ids, headers=_auth_headers(client, "first@kek.com"))
+    assert resp.status_code == 422
+    # repeated ids count once
+    same_id = str(uuid.uuid4())
+    resp = client.get("/user/batch", params=[("ids", same_id)] * 3, headers=_auth_headers(client, "first@kek.com"))
+    assert resp.status_code == 200
+    assert resp.json() == {"users": [], "missing": [same_id]}
+
+
+async def test_get_users_by_ids_without_matches(async_session_test, monkeypatch):
+    unknown = [uuid.uuid4(), uuid.uuid4()]
+    async with async_session_test() as session:
+        batch = await user_handlers._get_users_by_ids(unknown + unknown[:1], session)
+    assert batch.users == []
+    assert batch.missing == unknown
+
+    monkeypatch.setattr(user_handlers, "USER_BATCH_MAX_SIZE", 1)
+    with pytest.raises(HTTPException) as err:
+        async with async_session_test() as session:
+            await user_handlers._get_users_by_ids(unknown, session)
+    assert err.value.status_code == 422
@@ -0,0 +1,15 @@
+from passlib.context import CryptContext
+
+from src.api.handlers.auth.hasher import Hasher, configure_bcrypt_rounds, pwd_context
+
+
+def test_rehash_only_upgrades_the_cost():
+    original = pwd_context.to_dict()
+    try:
+        configure_bcrypt_rounds(5)
+        weaker, stronger = (CryptContext(schemes=["bcrypt"], bcrypt__rounds=rounds).hash("pw") for rounds in (4, 6))
+        assert Hasher.needs_update(weaker)
+        assert not Hasher.needs_update(stronger)
+        assert Hasher.get_password_hash("pw").startswith("$2b$05$")
+    finally:
+        pwd_context.load(original)
@@ -0,0 +1,29 @@
+from src.metrics import Histogram, _request_phases, timed
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("latency_seconds", "Latency", ("route", ), buckets=(0.1, 1.0))
+    histogram.observe(("/user/", ), 0.05)
+    histogram.observe(("/user/", ), 0.5)
+    histogram.observe(("/user/", ), 5)
+    lines = list(histogram.render())
+    assert 'latency_seconds_bucket{route="/user/",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{route="/user/",le="1.0"} 2' in lines
+    assert 'latency_seconds_bucket{route="/user/",le="+Inf"} 3' in lines
+    assert 'latency_seconds_count{route="/user/"} 3' in lines
+
+
+def test_timed_accumulates_only_inside_a_request():
+    with timed("db"):
+        pass
+    phases = {}
+    token = _request_phases.set(phases)
+    try:
+        with timed("db"):
+            pass
+        with timed("db"):
+            pass
+    finally:
+        _request_phases.reset(token)
+    assert set(phases) == {"db"}
+    assert phases["db"] >= 0
@@ -0,0 +1,49 @@
+import uuid
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.dialects.postgresql.asyncpg import dialect
+
+from src.api.handlers.auth.cache import UserSnapshot
+from src.api.handlers.users.user import _check_actor
+from src.db.dals import UserDAL
+from src.db.models import PortalRole
+
+USER = PortalRole.ROLE_PORTAL_USER
+ADMIN = PortalRole.ROLE_PORTAL_USER | PortalRole.ROLE_PORTAL_ADMIN
+SUPERADMIN = PortalRole.ROLE_PORTAL_USER | PortalRole.ROLE_PORTAL_SUPERADMIN
+
+# (actor roles, target roles, target is the actor) -> may delete / update the target
+PERMISSIONS = [
+    (USER, USER, True, True),
+    (USER, USER, False, False),
+    (USER, ADMIN, False, False),
+    (USER, SUPERADMIN, False, False),
+    (ADMIN, USER, False, True),
+    (ADMIN, ADMIN, False, False),
+    (ADMIN, SUPERADMIN, False, False),
+    (ADMIN, ADMIN, True, False),
+]
+
+
+@pytest.mark.parametrize("actor_roles, target_roles, is_self, permitted", PERMISSIONS)
+async def test_managed_by_matches_permission_rules(asyncpg_pool, actor_roles, target_roles, is_self, permitted):
+    actor_id = uuid.uuid4()
+    target_id = actor_id if is_self else uuid.uuid4()
+    predicate = UserDAL._managed_by(actor_id, actor_is_admin=bool(actor_roles & PortalRole.ROLE_PORTAL_ADMIN))
+    sql = str(predicate.compile(dialect=dialect(), compile_kwargs={"literal_binds": True}))
+    async with asyncpg_pool.acquire() as connection:
+        result = await connection.fetchval(
+            f"SELECT {sql} FROM (VALUES ($1::uuid, $2::integer)) AS users(user_id, roles)",
+            target_id, int(target_roles),
+        )
+    assert result is permitted
+
+
+def test_superadmin_cannot_act_through_the_api():
+    superadmin = UserSnapshot(
+        user_id=uuid.uuid4(), name="Nikolai", surname="Sviridov", email="lol@kek.com", is_active=True, roles=SUPERADMIN,
+    )
+    with pytest.raises(HTTPException) as error:
+        _check_actor(superadmin)
+    assert error.value.status_code == 406
@@ -0,0 +1,18 @@
+from src.db.query_log import QueryStats, check_query_budget, fingerprint
+
+
+def test_fingerprint_groups_statements_by_shape():
+    first = fingerprint("SELECT users.name FROM users WHERE users.user_id = $1::UUID AND users.roles & 2 != 0")
+    second = fingerprint("SELECT users.name\nFROM users WHERE users.user_id = $7::UUID AND users.roles & 4 != 0")
+    assert first == second == "SELECT users.name FROM users WHERE users.user_id = ? AND users.roles & ? != ?"
+    assert fingerprint("SELECT 1 WHERE a IN ($1, $2, $3)") == "SELECT ? WHERE a IN (...)"
+
+
+def test_query_budget_flags_repeated_statements():
+    stats = QueryStats("/user/")
+    for user_id in range(3):
+        stats.record(f"SELECT * FROM users WHERE user_id = {user_id}", 0.001)
+    assert stats.repeated() == [("SELECT * FROM users WHERE user_id = ?", 3)]
+    assert check_query_budget(stats, budget=5, route="GET /user/")
+    assert not check_query_budget(stats, budget=2, route="GET /user/")
+    assert check_query_budget(stats, budget=0, route="GET /user/")
@@ -0,0 +1,23 @@
+from src.db import session as db_session
+from src.db.session import RecentWrites
+
+
+def test_mark_drops_expired_keys_from_the_front(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(db_session.time, "monotonic", lambda: clock[0])
+    writes = RecentWrites(window=5)
+    writes.mark("a", "b", None)
+    clock[0] = 103.0
+    writes.mark("c", "a")
+    assert writes.recent("a") and writes.recent("b") and writes.recent("c")
+
+    clock[0] = 106.0
+    writes.mark("d")
+    # "b" expired and is gone, "a" was marked again at 103 and moved behind it
+    assert list(writes._expires_at) == ["c", "a", "d"]
+    assert not writes.recent("b")
+    assert writes.recent("a", "b")
+
+    clock[0] = 200.0
+    writes.mark()
+    assert writes._expires_at == {}
@@ -0,0 +1,85 @@
+import asyncio
+import time
+import uuid
+
+import pytest
+from fastapi import HTTPException
+from jose import jwt
+
+from src.api.handlers.auth import auth
+from src.api.handlers.auth.auth import (
+    REFRESH_TOKEN_TYPE, _snapshot_from_claims, create_token_pair, get_current_user_from_token, refresh_token_pair,
+)
+from src.config import CLAIMS_ACCESS_TOKEN_EXPIRE_MINUTES
+from src.db.models import PortalRole, User
+from src.settings import ALGORITHM, SECRET_KEY
+
+
+def _user(**kwargs) -> User:
+    fields = dict(
+        user_id=uuid.uuid4(), name="Nikolai", surname="Sviridov", email="lol@kek.com", is_active=True,
+        hashed_password="-", roles=PortalRole.ROLE_PORTAL_USER | PortalRole.ROLE_PORTAL_ADMIN, token_version=3,
+    )
+    fields.update(kwargs)
+    return User(**fields)
+
+
+def _refresh_against(monkeypatch, stored_user: User, refresh_token: str):
+    class StoredUserDAL:
+        def __init__(self, _session):
+            pass
+
+        async def get_user_by_id(self, user_id):
+            return stored_user if user_id == stored_user.user_id else None
+
+    monkeypatch.setattr(auth, "UserDAL", StoredUserDAL)
+    return asyncio.run(refresh_token_pair(refresh_token, session=None))
+
+
+def test_claims_token_carries_what_authorization_needs():
+    user = _user()
+    token = create_token_pair(user)
+    access_claims = jwt.decode(token.access_token, SECRET_KEY, algorithms=ALGORITHM)
+    snapshot = _snapshot_from_claims(access_claims)
+    assert snapshot.user_id == user.user_id
+    assert snapshot.email == user.email
+    assert snapshot.is_admin and not snapshot.is_superadmin
+    refresh_claims = jwt.decode(token.refresh_token, SECRET_KEY, algorithms=ALGORITHM)
+    assert refresh_claims["typ"] == REFRESH_TOKEN_TYPE
+    assert refresh_claims["ver"] == 3
+    assert "roles" not in refresh_claims
+
+
+def test_access_token_expiry_is_utc():
+    claims = jwt.decode(create_token_pair(_user()).access_token, SECRET_KEY, algorithms=ALGORITHM)
+    assert abs(claims["exp"] - (time.time() + CLAIMS_ACCESS_TOKEN_EXPIRE_MINUTES * 60)) < 5
+
+
+def test_refresh_issues_a_new_pair_for_a_current_version(monkeypatch):
+    user = _user()
+    token = _refresh_against(monkeypatch, user, create_token_pair(user).refresh_token)
+    assert jwt.decode(token.refresh_token, SECRET_KEY, algorithms=ALGORITHM)["ver"] == 3
+
+
+@pytest.mark.parametrize("stored_changes", [{"token_version": 4}, {"is_active": False}])
+def test_refresh_rejects_stale_version_and_inactive_user(monkeypatch, stored_changes):
+    user = _user()
+    refresh_token = create_token_pair(user).refresh_token
+    stored_user = _user(**{**{column: getattr(user, column) for column in ("user_id", "email")}, **stored_changes})
+    with pytest.raises(HTTPException) as error:
+        _refresh_against(monkeypatch, stored_user, refresh_token)
+    assert error.value.status_code == 401
+
+
+def test_refresh_rejects_an_access_token(monkeypatch):
+    user = _user()
+    with pytest.raises(HTTPException) as error:
+        _refresh_against(monkeypatch, user, create_token_pair(user).access_token)
+    assert error.value.status_code == 401
+
+
+def test_refresh_token_is_not_an_access_token():
+    refresh_token = create_token_pair(_user()).refresh_token
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(get_current_user_from_token(token=refresh_token, db=None))
+    assert error.value.status_code == 401